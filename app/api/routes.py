@@ -1,56 +1,234 @@
+import json
+import asyncio
+import logging
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, List
-from app.models.schemas import QueryRequest, QueryResponse, Poem
-from app.services.rag_service import RAGService
-from app.services.knowledge_graph_service import KnowledgeGraphService
-from app.services.sentiment_service import SentimentService
-from app.services.neo4j_kg_service import kg_service as neo4j_kg_service
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional
+from app.core.config import settings
+from app.core.async_service import async_service
+from app.core.single_flight import single_flight
+from app.models.schemas import QueryRequest, QueryResponse, BatchQueryRequest, BatchQueryResponse, Poem, SearchResult
+from app.core.service_container import service_container
+from app.services.embedding_cache import normalize_query
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 class SentimentRequest(BaseModel):
     text: str
 
 router = APIRouter()
 
-# 初始化服务
-rag_service = RAGService()
-kg_service = KnowledgeGraphService()
-sentiment_service = SentimentService()
-neo4j_service = neo4j_kg_service
+# 服务由进程级容器统一延迟创建，各接口按需获取
 
-@router.post("/query", response_model=QueryResponse)
-async def query_poems(request: QueryRequest):
-    """诗词查询接口"""
+# 相同的并发请求通过 single_flight 合并，只计算一次：/query 整体按
+# (查询, top_k, use_rag, 检索模式) 合并，检索和知识图谱查询另按各自的参数合并，
+# 流式接口与普通接口之间也能共享
+
+def _request_filters(request) -> Optional[Dict[str, List[str]]]:
+    """取出请求中的过滤条件，没有设置任何字段时为None"""
+    return (request.filters.to_dict() if request.filters else None) or None
+
+def _filters_key(filters: Optional[Dict[str, List[str]]]) -> tuple:
+    """过滤条件的可哈希形式，用作合并键的一部分"""
+    return tuple(sorted((field, tuple(sorted(values))) for field, values in (filters or {}).items()))
+
+async def _coalesced_search(rag_service, request: QueryRequest) -> List[SearchResult]:
+    """合并相同的并发检索"""
+    filters = _request_filters(request)
+    key = (normalize_query(request.query), request.top_k, request.search_mode, _filters_key(filters))
+    return await single_flight.do(
+        "search", key,
+        lambda: rag_service.async_search(request.query, request.top_k, request.search_mode, filters)
+    )
+
+async def _coalesced_related_entities(neo4j_service, query: str) -> Dict[str, List]:
+    """合并相同的并发知识图谱查询"""
+    return await single_flight.do(
+        "knowledge_graph", normalize_query(query),
+        lambda: neo4j_service.get_related_entities(query)
+    )
+
+def _stage_timeout(timeout_ms: int) -> Optional[float]:
+    """阶段超时（秒），不大于0时不限制"""
+    return timeout_ms / 1000 if timeout_ms > 0 else None
+
+async def _optional_stage(stage: str, coro: Awaitable, timeout_ms: int) -> Any:
+    """运行可选阶段，超时或失败时记录日志并返回None，不影响其余结果"""
+    try:
+        return await asyncio.wait_for(coro, _stage_timeout(timeout_ms))
+    except asyncio.TimeoutError:
+        logger.warning(f"查询阶段 {stage} 超时（{timeout_ms}ms），返回部分结果")
+    except Exception as e:
+        logger.error(f"查询阶段 {stage} 失败: {e}")
+    return None
+
+async def _compute_query(request: QueryRequest) -> QueryResponse:
+    """执行一次完整的诗词查询
+    
+    各阶段按依赖关系并发执行：
+        检索 ──┬── 答案生成
+               └── 情感分析（可选，线程池）
+        知识图谱查询（可选，只依赖查询文本，与检索同时开始）
+    可选阶段有各自的超时，超时或失败时对应字段为空，其余结果照常返回。
+    """
+    rag_service = await service_container.aget("rag")
+    neo4j_service = await service_container.aget("neo4j")
+    sentiment_service = await service_container.aget("sentiment")
+    
+    kg_task = asyncio.create_task(_optional_stage(
+        "knowledge_graph",
+        _coalesced_related_entities(neo4j_service, request.query),
+        settings.KG_TIMEOUT_MS
+    ))
+    sentiment_task = None
     try:
         # 执行RAG检索（异步）
-        results = await rag_service.async_search(request.query, request.top_k)
+        results = await _coalesced_search(rag_service, request)
+        
+        # 对第一个结果进行情感分析，在线程池中与答案生成同时进行
+        if results:
+            sentiment_task = asyncio.create_task(_optional_stage(
+                "sentiment",
+                async_service.run_in_threadpool(sentiment_service.analyze_sentiment, results[0].poem.content),
+                settings.SENTIMENT_TIMEOUT_MS
+            ))
         
         # 生成答案（异步）
         answer = None
         if request.use_rag:
             answer = await rag_service.async_generate_answer(request.query, results)
         
-        # 获取知识图谱信息（使用Neo4j）
-        kg_data = await neo4j_service.get_related_entities(request.query)
+        kg_data = await kg_task
+        sentiment = await sentiment_task if sentiment_task else None
+    finally:
+        # 检索或生成失败时取消尚未完成的阶段
+        for task in (kg_task, sentiment_task):
+            if task and not task.done():
+                task.cancel()
+    
+    return QueryResponse(
+        results=results,
+        knowledge_graph=kg_data,
+        sentiment_analysis=sentiment,
+        generated_answer=answer
+    )
+
+@router.post("/query", response_model=QueryResponse)
+async def query_poems(request: QueryRequest):
+    """诗词查询接口"""
+    try:
+        key = (normalize_query(request.query), request.top_k, request.use_rag, request.search_mode,
+               _filters_key(_request_filters(request)))
+        return await single_flight.do("query", key, lambda: _compute_query(request))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_poems_batch(request: BatchQueryRequest):
+    """批量诗词查询接口
+    
+    全部查询一次完成向量化和向量检索，答案生成并发进行（受 LLM_MAX_CONCURRENCY 限制）。
+    批量接口只返回检索结果和生成的答案，不包含知识图谱和情感分析。
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="queries不能为空")
+    if len(request.queries) > settings.BATCH_QUERY_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"单次最多查询{settings.BATCH_QUERY_MAX_SIZE}条")
+    
+    try:
+        rag_service = await service_container.aget("rag")
+        batch_results = await rag_service.async_search_batch(
+            request.queries, request.top_k, request.search_mode, _request_filters(request)
+        )
+        
+        answers = [None] * len(request.queries)
+        if request.use_rag:
+            answers = await rag_service.async_generate_answers(request.queries, batch_results)
         
-        # 情感分析
-        sentiment = None
+        return BatchQueryResponse(responses=[
+            QueryResponse(results=results, generated_answer=answer)
+            for results, answer in zip(batch_results, answers)
+        ])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/query/coalescing")
+async def get_coalescing_statistics():
+    """获取并发请求合并统计（各分组的调用数、实际执行数和合并命中数）"""
+    return single_flight.stats()
+
+def _sse_event(event: str, data: Any) -> str:
+    """格式化一条SSE事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _stream_query_events(request: QueryRequest) -> AsyncIterator[str]:
+    """依次产出检索结果、答案片段、知识图谱和情感分析事件
+    
+    各阶段的并发方式与 _compute_query 相同：知识图谱查询与检索同时开始，情感分析
+    在检索后与答案生成同时进行；可选阶段超时或失败时对应事件的数据为 null。
+    """
+    kg_task = sentiment_task = None
+    try:
+        rag_service = await service_container.aget("rag")
+        neo4j_service = await service_container.aget("neo4j")
+        sentiment_service = await service_container.aget("sentiment")
+        
+        kg_task = asyncio.create_task(_optional_stage(
+            "knowledge_graph",
+            _coalesced_related_entities(neo4j_service, request.query),
+            settings.KG_TIMEOUT_MS
+        ))
+        
+        # 检索结果最先返回
+        results = await _coalesced_search(rag_service, request)
+        yield _sse_event("results", [result.model_dump() for result in results])
+        
+        # 情感分析与答案生成同时进行，知识图谱和情感分析在生成结束后发送
         if results:
-            # 对第一个结果进行情感分析
-            sentiment = sentiment_service.analyze_sentiment(results[0].poem.content)
+            sentiment_task = asyncio.create_task(_optional_stage(
+                "sentiment",
+                async_service.run_in_threadpool(sentiment_service.analyze_sentiment, results[0].poem.content),
+                settings.SENTIMENT_TIMEOUT_MS
+            ))
         
-        return QueryResponse(
-            results=results,
-            knowledge_graph=kg_data,
-            sentiment_analysis=sentiment,
-            generated_answer=answer
-        )
+        if request.use_rag:
+            async for chunk in rag_service.astream_answer(request.query, results):
+                yield _sse_event("token", {"text": chunk})
+        
+        yield _sse_event("knowledge_graph", await kg_task)
+        if sentiment_task:
+            yield _sse_event("sentiment", await sentiment_task)
+        
+        yield _sse_event("done", {})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        yield _sse_event("error", {"stage": "query", "detail": str(e)})
+    finally:
+        # 客户端提前断开或检索、生成失败时取消尚未完成的任务
+        for task in (kg_task, sentiment_task):
+            if task and not task.done():
+                task.cancel()
+
+@router.post("/query/stream")
+async def query_poems_stream(request: QueryRequest):
+    """诗词查询接口（SSE流式）
+    
+    事件顺序：results（检索结果）→ token（答案片段，多条）→ knowledge_graph →
+    sentiment → done；知识图谱和情感分析超时或失败时数据为 null，检索或生成
+    出错时发送 error 事件。
+    """
+    return StreamingResponse(
+        _stream_query_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/poems/{poem_id}")
 async def get_poem(poem_id: str):
     """获取特定诗词详情"""
+    rag_service = await service_container.aget("rag")
     poem = await rag_service.async_get_poem_by_id(poem_id)
     if not poem:
         raise HTTPException(status_code=404, detail="Poem not found")
@@ -59,6 +237,7 @@ async def get_poem(poem_id: str):
 @router.get("/poets/{poet_name}")
 async def get_poet_info(poet_name: str):
     """获取诗人信息及作品列表"""
+    neo4j_service = await service_container.aget("neo4j")
     poet_info = await neo4j_service.get_poet_info(poet_name)
     if not poet_info:
         raise HTTPException(status_code=404, detail="Poet not found")
@@ -68,7 +247,8 @@ async def get_poet_info(poet_name: str):
 async def analyze_sentiment(request: SentimentRequest):
     """情感分析接口"""
     try:
-        result = sentiment_service.analyze_sentiment(request.text)
+        sentiment_service = await service_container.aget("sentiment")
+        result = await async_service.run_in_threadpool(sentiment_service.analyze_sentiment, request.text)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -77,6 +257,7 @@ async def analyze_sentiment(request: SentimentRequest):
 async def search_poems_by_theme(theme: str, limit: int = 10):
     """根据主题搜索诗词"""
     try:
+        neo4j_service = await service_container.aget("neo4j")
         poems = await neo4j_service.search_poems_by_theme(theme, limit)
         return poems
     except Exception as e:
@@ -86,6 +267,7 @@ async def search_poems_by_theme(theme: str, limit: int = 10):
 async def search_poems_by_emotion(emotion: str, limit: int = 10):
     """根据情感搜索诗词"""
     try:
+        neo4j_service = await service_container.aget("neo4j")
         poems = await neo4j_service.get_poems_by_emotion(emotion, limit)
         return poems
     except Exception as e:
@@ -95,6 +277,7 @@ async def search_poems_by_emotion(emotion: str, limit: int = 10):
 async def get_kg_statistics():
     """获取知识图谱统计信息"""
     try:
+        neo4j_service = await service_container.aget("neo4j")
         stats = await neo4j_service.get_knowledge_graph_statistics()
         return stats
     except Exception as e:
@@ -0,0 +1,181 @@
+import json
+import zlib
+import logging
+import msgpack
+import orjson
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from pydantic import BaseModel
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 条目头：魔数、格式版本、编解码器ID、标志位，共4字节。
+# 魔数 0xC1 在msgpack中保留不用，也不是合法的UTF-8首字节，不会与旧版JSON文本混淆
+MAGIC = 0xC1
+FORMAT_VERSION = 1
+HEADER_SIZE = 4
+
+# 标志位
+FLAG_ZLIB = 0x01
+FLAG_MODELS = 0x02
+
+# pydantic 模型的标记字段
+MODEL_TAG = "__model__"
+MODEL_DATA = "data"
+
+_models: Dict[str, Type[BaseModel]] = {}
+
+def register_model(model: Type[BaseModel]) -> Type[BaseModel]:
+    """登记可在缓存中还原的 pydantic 模型，只有登记过的模型会被还原"""
+    _models[model.__name__] = model
+    return model
+
+def _default(value: Any) -> Any:
+    """序列化时遇到非基本类型的处理：pydantic 模型转为带标记的字典"""
+    if isinstance(value, BaseModel):
+        return {MODEL_TAG: type(value).__name__, MODEL_DATA: value.model_dump(mode="json")}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+def _restore(value: Any) -> Any:
+    """把带标记的字典还原为 pydantic 模型，只在条目含模型时调用"""
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+    if isinstance(value, dict):
+        name = value.get(MODEL_TAG) if len(value) == 2 else None
+        model = _models.get(name) if isinstance(name, str) else None
+        if model is not None and MODEL_DATA in value:
+            return model.model_validate(value[MODEL_DATA])
+        return {key: _restore(item) for key, item in value.items()}
+    return value
+
+class _ModelTracker:
+    """包装序列化回调，记录是否遇到过 pydantic 模型"""
+    
+    def __init__(self):
+        self.found = False
+    
+    def __call__(self, value: Any) -> Any:
+        if isinstance(value, BaseModel):
+            self.found = True
+        return _default(value)
+
+class Codec:
+    """一种序列化格式"""
+    
+    def __init__(self, codec_id: int, name: str,
+                 dumps: Callable[[Any, Callable[[Any], Any]], bytes],
+                 loads: Callable[[bytes], Any]):
+        self.codec_id = codec_id
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+def _json_dumps(value: Any, default: Callable[[Any], Any]) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+def _orjson_dumps(value: Any, default: Callable[[Any], Any]) -> bytes:
+    return orjson.dumps(value, default=default, option=orjson.OPT_NON_STR_KEYS)
+
+def _msgpack_dumps(value: Any, default: Callable[[Any], Any]) -> bytes:
+    return msgpack.packb(value, default=default, use_bin_type=True)
+
+def _msgpack_loads(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+# 编解码器ID写入条目头，已分配的ID不可更改
+CODECS: Dict[int, Codec] = {
+    1: Codec(1, "json", _json_dumps, json.loads),
+    2: Codec(2, "orjson", _orjson_dumps, orjson.loads),
+    3: Codec(3, "msgpack", _msgpack_dumps, _msgpack_loads),
+}
+
+# 自动选择时使用的编解码器
+DEFAULT_CODEC = "msgpack"
+
+class CacheCodec:
+    """缓存值的编解码
+    
+    每个条目以4字节头开始，记录格式版本、编解码器和是否压缩，因此不同进程
+    可以使用不同的编解码器，读取时按条目头选择。默认使用 msgpack；超过阈值
+    的条目用 zlib 压缩，压缩后不变小则保留原文。pydantic 模型（如 Poem、SearchResult）按类名标记，
+    读取时还原为模型对象。没有条目头的数据按旧版本的JSON文本读取。
+    """
+    
+    def __init__(self, codec: str = "auto", compress_threshold: int = 1024, compress_level: int = 6):
+        """初始化
+        
+        Args:
+            codec: 编解码器名称（msgpack / orjson / json），auto 时使用 msgpack
+            compress_threshold: 压缩阈值（字节），小于0时不压缩
+            compress_level: zlib 压缩级别
+        """
+        available = {c.name: c for c in CODECS.values()}
+        if codec == "auto":
+            codec = DEFAULT_CODEC
+        elif codec not in available:
+            logger.warning(f"未知的缓存编解码器 {codec}，改用 {DEFAULT_CODEC}")
+            codec = DEFAULT_CODEC
+        self.codec = available[codec]
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        logger.info(f"缓存编解码器: {self.codec.name}")
+    
+    def encode(self, value: Any) -> bytes:
+        """编码缓存值，无法序列化时抛出 ValueError"""
+        tracker = _ModelTracker()
+        try:
+            payload = self.codec.dumps(value, tracker)
+        except Exception as e:
+            raise ValueError(f"缓存值序列化失败: {e}") from e
+        
+        flags = FLAG_MODELS if tracker.found else 0
+        if 0 <= self.compress_threshold <= len(payload):
+            compressed = zlib.compress(payload, self.compress_level)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FLAG_ZLIB
+        return bytes((MAGIC, FORMAT_VERSION, self.codec.codec_id, flags)) + payload
+    
+    @staticmethod
+    def parse_header(data: bytes) -> Optional[Tuple[int, int, int]]:
+        """解析条目头，返回 (格式版本, 编解码器ID, 标志位)，旧版本数据返回None"""
+        if len(data) < HEADER_SIZE or data[0] != MAGIC:
+            return None
+        return data[1], data[2], data[3]
+    
+    def decode(self, data: bytes) -> Any:
+        """解码缓存值，格式版本或编解码器不受支持时抛出 ValueError"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        header = self.parse_header(data)
+        if header is None:
+            return json.loads(data)
+        
+        version, codec_id, flags = header
+        if version != FORMAT_VERSION:
+            raise ValueError(f"不支持的缓存格式版本: {version}")
+        codec = CODECS.get(codec_id)
+        if codec is None:
+            raise ValueError(f"缓存编解码器不可用: {codec_id}")
+        
+        try:
+            payload = data[HEADER_SIZE:]
+            if flags & FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+            value = codec.loads(payload)
+            return _restore(value) if flags & FLAG_MODELS else value
+        except Exception as e:
+            raise ValueError(f"缓存值解码失败: {e}") from e
+
+def _register_schema_models():
+    """登记服务返回的数据模型"""
+    from app.models import schemas
+    for name in dir(schemas):
+        model = getattr(schemas, name)
+        if isinstance(model, type) and issubclass(model, BaseModel) and model is not BaseModel:
+            register_model(model)
+
+_register_schema_models()
\ No newline at end of file
@@ -1,32 +1,69 @@
+import uuid
+import asyncio
 import hashlib
 import json
 import redis
+import redis.asyncio as aioredis
 import logging
 from typing import Any, Callable, Optional, Dict
 from functools import wraps
 from app.core.config import settings
+from app.core.lru_cache import TTLCache
+from app.core.cache_codec import CacheCodec
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class CacheManager:
-    """缓存管理器"""
+    """缓存管理器
+    
+    两级缓存：一级为进程内的TTL缓存，按条目数和内存占用淘汰，热点数据直接在
+    进程内命中，不需要网络往返；二级为Redis，在多个进程间共享。一级缓存保存
+    编码后的字节，每次命中都解码出新的对象，调用方修改取出的值不会影响缓存。
+    写入和删除时通过Redis发布/订阅通知其他进程清除各自的一级缓存；一级缓存的
+    有效期另有上限，即使漏收通知也只会在短时间内读到旧值。
+    
+    Redis中的值由 CacheCodec 编码为带条目头的二进制（msgpack/orjson，较大的
+    条目压缩），可直接缓存 pydantic 模型。
+    
+    异步代码使用 aget / aset / adelete，不阻塞事件循环。异步客户端由 aopen 在应用
+    启动时创建、aclose 在关闭时释放，整个应用只有一个连接池；未打开异步客户端的
+    事件循环（脚本、测试中的 asyncio.run）改用线程池中的同步客户端。同步的
+    get / set / delete 保留给脚本和线程池中的代码使用。
+    """
     
     def __init__(self):
         """初始化缓存管理器"""
         self.redis_client = None
+        self.instance_id = uuid.uuid4().hex
+        self.l1 = TTLCache(settings.CACHE_L1_SIZE, settings.CACHE_L1_MAX_BYTES)
+        self.codec = CacheCodec(
+            settings.CACHE_CODEC, settings.CACHE_COMPRESS_THRESHOLD, settings.CACHE_COMPRESS_LEVEL
+        )
+        self._pubsub_thread = None
+        self._async_client = None
+        self._async_loop = None
         self._init_redis()
+        self._subscribe_invalidation()
+    
+    @staticmethod
+    def _connection_kwargs() -> Dict[str, Any]:
+        """同步和异步连接池共用的连接参数，缓存值为二进制，不解码为字符串"""
+        return {
+            "host": settings.REDIS_HOST,
+            "port": settings.REDIS_PORT,
+            "db": settings.REDIS_DB,
+            "max_connections": settings.REDIS_MAX_CONNECTIONS,
+            "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": settings.REDIS_CONNECT_TIMEOUT,
+            "decode_responses": False
+        }
     
     def _init_redis(self):
         """初始化Redis连接"""
         try:
-            self.redis_client = redis.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                decode_responses=True
-            )
+            self.redis_client = redis.Redis(connection_pool=redis.ConnectionPool(**self._connection_kwargs()))
             # 测试连接
             self.redis_client.ping()
             logger.info("Redis连接成功")
@@ -34,6 +71,100 @@ class CacheManager:
             logger.error(f"Redis连接失败: {e}")
             self.redis_client = None
     
+    def _subscribe_invalidation(self):
+        """订阅缓存失效通知，在后台线程中清除本进程的一级缓存"""
+        if not self.redis_client:
+            return
+        try:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{settings.CACHE_INVALIDATION_CHANNEL: self._on_invalidation})
+            self._pubsub_thread = pubsub.run_in_thread(
+                sleep_time=1.0, daemon=True, exception_handler=self._on_pubsub_error
+            )
+        except Exception as e:
+            logger.warning(f"订阅缓存失效通知失败，一级缓存仅依赖有效期: {e}")
+    
+    def _on_invalidation(self, message: Dict[str, Any]):
+        """处理其他进程发出的失效通知"""
+        try:
+            payload = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        if payload.get("sender") == self.instance_id:
+            return
+        keys = payload.get("keys")
+        if keys == "*":
+            self.l1.clear()
+        else:
+            for key in keys or []:
+                self.l1.delete(key)
+    
+    @staticmethod
+    def _on_pubsub_error(error: Exception, pubsub, thread):
+        """订阅连接出错时记录日志，下次读取消息时自动重连并重新订阅"""
+        logger.warning(f"缓存失效通知连接异常: {error}")
+    
+    def _invalidation_message(self, keys) -> str:
+        """生成失效通知"""
+        return json.dumps({"sender": self.instance_id, "keys": keys}, ensure_ascii=False)
+    
+    def _l1_set(self, key: str, serialized: bytes, ttl: float):
+        """以编码后的字节写入一级缓存，有效期不超过 CACHE_L1_TTL"""
+        self.l1.set(key, serialized, min(ttl, settings.CACHE_L1_TTL), len(serialized))
+    
+    def _l1_get(self, key: str) -> Optional[Any]:
+        """从一级缓存读取并解码，每次返回新的对象"""
+        serialized = self.l1.get(key)
+        if serialized is None:
+            return None
+        try:
+            return self.codec.decode(serialized)
+        except ValueError as e:
+            logger.warning(f"缓存数据无法解码，视为未命中: {e}")
+            self.l1.delete(key)
+            return None
+    
+    def _backfill(self, key: str, cached_data: Optional[bytes], pttl: Optional[int]) -> Optional[Any]:
+        """解码从Redis读到的数据并回填一级缓存，回填的条目不会比Redis中的更晚过期"""
+        if not cached_data:
+            return None
+        try:
+            data = self.codec.decode(cached_data)
+        except ValueError as e:
+            logger.warning(f"缓存数据无法解码，视为未命中: {e}")
+            return None
+        ttl = pttl / 1000 if pttl and pttl > 0 else settings.CACHE_L1_TTL
+        self._l1_set(key, cached_data, ttl)
+        return data
+    
+    async def aopen(self):
+        """在当前事件循环中创建异步客户端，重复调用不会新建连接池
+        
+        同步客户端初始化失败时视为Redis不可用，不创建异步客户端。
+        """
+        if not self.redis_client or self._async_client is not None:
+            return
+        self._async_client = aioredis.Redis(
+            connection_pool=aioredis.ConnectionPool(**self._connection_kwargs())
+        )
+        self._async_loop = asyncio.get_running_loop()
+    
+    def _async_redis(self) -> Optional[aioredis.Redis]:
+        """获取异步客户端，异步连接绑定在创建它的事件循环上，其他事件循环中返回None"""
+        if self._async_client is None or self._async_loop is not asyncio.get_running_loop():
+            return None
+        return self._async_client
+    
+    async def aclose(self):
+        """关闭 aopen 创建的异步连接池"""
+        if self._async_client is not None:
+            try:
+                await self._async_client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭Redis异步连接失败: {e}")
+            self._async_client = None
+            self._async_loop = None
+    
     def _generate_cache_key(self, func_name: str, *args, **kwargs) -> str:
         """生成缓存键"""
         # 将参数序列化为字符串
@@ -43,41 +174,120 @@ class CacheManager:
         return hashlib.md5(key_string.encode('utf-8')).hexdigest()
     
     def get(self, key: str) -> Optional[Any]:
-        """从缓存获取数据"""
+        """从缓存获取数据，先查一级缓存，未命中时读Redis并回填"""
+        data = self._l1_get(key)
+        if data is not None:
+            return data
+        
         if not self.redis_client:
             return None
             
         try:
-            cached_data = self.redis_client.get(key)
-            if cached_data:
-                return json.loads(cached_data)
+            # 同一次往返取回数据和剩余有效期，回填的一级缓存不会比Redis中的更晚过期
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            cached_data, pttl = pipe.execute()
+            return self._backfill(key, cached_data, pttl)
+        except Exception as e:
+            logger.warning(f"从缓存获取数据失败: {e}")
+        return None
+    
+    async def aget(self, key: str) -> Optional[Any]:
+        """异步从缓存获取数据"""
+        data = self._l1_get(key)
+        if data is not None:
+            return data
+        
+        client = self._async_redis()
+        if client is None:
+            # 当前事件循环没有打开异步客户端，在线程池中使用同步客户端
+            return await asyncio.to_thread(self.get, key)
+        
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.pttl(key)
+                cached_data, pttl = await pipe.execute()
+            return self._backfill(key, cached_data, pttl)
         except Exception as e:
             logger.warning(f"从缓存获取数据失败: {e}")
         return None
     
     def set(self, key: str, data: Any, ttl: int = 3600) -> bool:
-        """设置缓存数据"""
+        """设置缓存数据，并通知其他进程清除该键的一级缓存"""
+        try:
+            serialized = self.codec.encode(data)
+        except ValueError as e:
+            logger.warning(f"设置缓存数据失败: {e}")
+            return False
+        self._l1_set(key, serialized, ttl)
+        
         if not self.redis_client:
             return False
             
         try:
-            self.redis_client.setex(
-                key, 
-                ttl, 
-                json.dumps(data, ensure_ascii=False)
-            )
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(key, ttl, serialized)
+            pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message([key]))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"设置缓存数据失败: {e}")
+            return False
+    
+    async def aset(self, key: str, data: Any, ttl: int = 3600) -> bool:
+        """异步设置缓存数据，并通知其他进程清除该键的一级缓存"""
+        client = self._async_redis()
+        if client is None:
+            return await asyncio.to_thread(self.set, key, data, ttl)
+        
+        try:
+            serialized = self.codec.encode(data)
+        except ValueError as e:
+            logger.warning(f"设置缓存数据失败: {e}")
+            return False
+        self._l1_set(key, serialized, ttl)
+        
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, serialized)
+                pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message([key]))
+                await pipe.execute()
             return True
         except Exception as e:
             logger.warning(f"设置缓存数据失败: {e}")
             return False
     
     def delete(self, key: str) -> bool:
-        """删除缓存数据"""
+        """删除缓存数据，并通知其他进程清除该键的一级缓存"""
+        self.l1.delete(key)
         if not self.redis_client:
             return False
             
         try:
-            self.redis_client.delete(key)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.delete(key)
+            pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message([key]))
+            pipe.execute()
+            return True
+        except Exception as e:
+            logger.warning(f"删除缓存数据失败: {e}")
+            return False
+    
+    async def adelete(self, key: str) -> bool:
+        """异步删除缓存数据，并通知其他进程清除该键的一级缓存"""
+        client = self._async_redis()
+        if client is None:
+            return await asyncio.to_thread(self.delete, key)
+        
+        self.l1.delete(key)
+        
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.delete(key)
+                pipe.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message([key]))
+                await pipe.execute()
             return True
         except Exception as e:
             logger.warning(f"删除缓存数据失败: {e}")
@@ -91,8 +301,8 @@ class CacheManager:
                 # 生成缓存键
                 cache_key = self._generate_cache_key(func.__name__, *args, **kwargs)
                 
-                # 尝试从缓存获取数据
-                cached_result = self.get(cache_key)
+                # 尝试从缓存获取数据（异步客户端，不阻塞事件循环）
+                cached_result = await self.aget(cache_key)
                 if cached_result is not None:
                     logger.info(f"使用缓存结果: {func.__name__}")
                     return cached_result
@@ -104,7 +314,7 @@ class CacheManager:
                     result = func(*args, **kwargs)
                 
                 # 缓存结果
-                self.set(cache_key, result, ttl)
+                await self.aset(cache_key, result, ttl)
                 return result
             
             @wraps(func)
@@ -133,7 +343,7 @@ class CacheManager:
     def get_cache_info(self) -> Dict[str, Any]:
         """获取缓存信息"""
         if not self.redis_client:
-            return {"status": "Redis未连接"}
+            return {"status": "Redis未连接", "l1": self.l1.stats()}
         
         try:
             info = self.redis_client.info()
@@ -141,18 +351,21 @@ class CacheManager:
                 "status": "连接正常",
                 "used_memory": info.get("used_memory_human", "未知"),
                 "connected_clients": info.get("connected_clients", "未知"),
-                "total_commands_processed": info.get("total_commands_processed", "未知")
+                "total_commands_processed": info.get("total_commands_processed", "未知"),
+                "l1": self.l1.stats()
             }
         except Exception as e:
-            return {"status": f"获取信息失败: {e}"}
+            return {"status": f"获取信息失败: {e}", "l1": self.l1.stats()}
     
     def clear_all_cache(self) -> bool:
         """清空所有缓存"""
+        self.l1.clear()
         if not self.redis_client:
             return False
         
         try:
             self.redis_client.flushdb()
+            self.redis_client.publish(settings.CACHE_INVALIDATION_CHANNEL, self._invalidation_message("*"))
             logger.info("已清空所有缓存")
             return True
         except Exception as e:
@@ -160,5 +373,4 @@ class CacheManager:
             return False
 
 # 全局缓存管理器实例
-import asyncio
 cache_manager = CacheManager()
\ No newline at end of file
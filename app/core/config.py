@@ -8,11 +8,14 @@ class Settings:
     # API配置
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
     API_PORT = int(os.getenv("API_PORT", 8000))
+    # 服务启动后在后台预加载RAG等服务
+    WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() == "true"
     
     # OpenAI API配置
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
     
     # 数据目录配置
     RAW_DATA_PATH = os.getenv("RAW_DATA_PATH", "data/raw")
@@ -22,16 +25,79 @@ class Settings:
     # 向量数据库配置
     VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "data/vector_db")
     
+    # 向量索引配置
+    FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")  # flat / hnsw / ivf_flat / ivf_pq
+    FAISS_NLIST = int(os.getenv("FAISS_NLIST", 1024))
+    FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+    FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", 32))
+    FAISS_EF_CONSTRUCTION = int(os.getenv("FAISS_EF_CONSTRUCTION", 200))
+    FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+    FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", 16))
+    FAISS_PQ_NBITS = int(os.getenv("FAISS_PQ_NBITS", 8))
+    FAISS_TRAIN_SAMPLE = int(os.getenv("FAISS_TRAIN_SAMPLE", 50000))
+    
+    # 关键词倒排索引配置
+    KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "data/processed/keyword_index")
+    
     # 代理配置
     HTTP_PROXY = os.getenv("HTTP_PROXY", "")
     HTTPS_PROXY = os.getenv("HTTPS_PROXY", "")
     
     # RAG配置
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")  # openai / local / hashing
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-ada-002")
+    LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "BAAI/bge-small-zh-v1.5")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+    HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", 512))
     CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 500))
     CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", 50))
     TOP_K_RESULTS = int(os.getenv("TOP_K_RESULTS", 5))
     
+    # 查询向量缓存配置
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 5000))
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "data/processed/embedding_cache.sqlite")
+    
+    # 批量向量化配置（构建向量数据库时使用）
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 4))
+    EMBEDDING_TOKENS_PER_MINUTE = int(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", 0))  # 0表示不限制
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", 5))
+    EMBEDDING_CHECKPOINT_DIR = os.getenv("EMBEDDING_CHECKPOINT_DIR", "data/processed/embedding_checkpoint")
+    VECTOR_BUILD_BATCH_SIZE = int(os.getenv("VECTOR_BUILD_BATCH_SIZE", 4096))  # 每批向量化并加入索引的片段数
+    
+    # 答案上下文的token预算，0表示不限制
+    ANSWER_CONTEXT_MAX_TOKENS = int(os.getenv("ANSWER_CONTEXT_MAX_TOKENS", 2000))
+    
+    # 生成答案缓存配置
+    ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", 2000))
+    ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 86400))
+    ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", 0.95))  # 大于1时关闭相似匹配
+    
+    # 混合检索配置
+    SEARCH_MODE = os.getenv("SEARCH_MODE", "hybrid")  # vector / keyword / hybrid
+    HYBRID_FUSION_METHOD = os.getenv("HYBRID_FUSION_METHOD", "rrf")  # rrf / score
+    RRF_K = int(os.getenv("RRF_K", 60))
+    HYBRID_OVERFETCH = int(os.getenv("HYBRID_OVERFETCH", 2))
+    
+    # 向量检索按诗词聚合配置
+    CHUNK_AGGREGATION = os.getenv("CHUNK_AGGREGATION", "max")  # max / sum / none（直接返回片段）
+    VECTOR_OVERFETCH = int(os.getenv("VECTOR_OVERFETCH", 3))  # 首次取回的片段数为诗词数的倍数
+    VECTOR_MAX_FETCH = int(os.getenv("VECTOR_MAX_FETCH", 1000))  # 自适应取回的片段数上限
+    
+    # 重排序配置
+    RERANKER = os.getenv("RERANKER", "cross_encoder")  # cross_encoder / lexical / none
+    RERANKER_MODEL = os.getenv("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 20))
+    RERANK_TIMEOUT_MS = int(os.getenv("RERANK_TIMEOUT_MS", 300))
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 32))
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 10000))
+    
+    # 查询阶段超时配置（毫秒），可选阶段超时后以空结果返回，0表示不限制
+    KG_TIMEOUT_MS = int(os.getenv("KG_TIMEOUT_MS", 1500))
+    SENTIMENT_TIMEOUT_MS = int(os.getenv("SENTIMENT_TIMEOUT_MS", 1000))
+    
+    # 批量查询配置
+    BATCH_QUERY_MAX_SIZE = int(os.getenv("BATCH_QUERY_MAX_SIZE", 500))
+    
     # 前端配置
     FRONTEND_PORT = int(os.getenv("FRONTEND_PORT", 8501))
     
@@ -44,5 +110,17 @@ class Settings:
     REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
     REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB = int(os.getenv("REDIS_DB", 0))
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 2.0))
+    REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1.0))
+    
+    # 进程内一级缓存配置（位于Redis之前）
+    CACHE_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", 10000))
+    CACHE_L1_MAX_BYTES = int(os.getenv("CACHE_L1_MAX_BYTES", 64 * 1024 * 1024))
+    CACHE_L1_TTL = int(os.getenv("CACHE_L1_TTL", 300))  # 一级缓存有效期上限（秒），兜底未收到的失效通知
+    CACHE_INVALIDATION_CHANNEL = os.getenv("CACHE_INVALIDATION_CHANNEL", "cache_invalidation")
+    CACHE_CODEC = os.getenv("CACHE_CODEC", "auto")  # auto/msgpack/orjson/json
+    CACHE_COMPRESS_THRESHOLD = int(os.getenv("CACHE_COMPRESS_THRESHOLD", 1024))  # 超过该字节数时zlib压缩，小于0时不压缩
+    CACHE_COMPRESS_LEVEL = int(os.getenv("CACHE_COMPRESS_LEVEL", 6))
 
 settings = Settings()
\ No newline at end of file
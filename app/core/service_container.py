@@ -0,0 +1,116 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from app.core.async_service import async_service
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ServiceContainer:
+    """进程级服务容器
+    
+    各服务以工厂函数注册，首次使用时才创建，之后在整个进程内共享同一实例。
+    创建过程加锁，并发请求不会重复加载；容器记录每个组件的加载状态、
+    耗时和错误信息，供就绪检查使用。
+    """
+    
+    def __init__(self):
+        """初始化服务容器"""
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._required: Dict[str, bool] = {}
+        self._instances: Dict[str, Any] = {}
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+    
+    def register(self, name: str, factory: Callable[[], Any], required: bool = True):
+        """注册服务
+        
+        Args:
+            name: 服务名称
+            factory: 创建服务实例的工厂函数
+            required: 是否为就绪的必要条件
+        """
+        self._factories[name] = factory
+        self._required[name] = required
+        self._locks[name] = threading.Lock()
+        self._status[name] = {"state": "pending", "required": required, "load_time_ms": None, "error": None}
+    
+    def get(self, name: str) -> Any:
+        """获取服务实例，尚未创建时同步创建"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is not None:
+                return instance
+            
+            status = self._status[name]
+            status.update(state="loading", error=None)
+            start_time = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                status.update(state="failed", error=str(e))
+                logger.error(f"服务 {name} 加载失败: {e}")
+                raise
+            finally:
+                status["load_time_ms"] = round((time.perf_counter() - start_time) * 1000, 1)
+            
+            self._instances[name] = instance
+            status["state"] = "ready"
+            logger.info(f"服务 {name} 加载完成，耗时{status['load_time_ms']}ms")
+            return instance
+    
+    async def aget(self, name: str) -> Any:
+        """异步获取服务实例，创建过程在线程池中执行，不阻塞事件循环"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        return await async_service.run_in_threadpool(self.get, name)
+    
+    async def warmup(self, names: Optional[List[str]] = None):
+        """依次预加载服务，单个服务失败不影响其余服务"""
+        for name in names or list(self._factories):
+            try:
+                await self.aget(name)
+            except Exception:
+                # 错误已记录在组件状态中
+                continue
+    
+    def is_ready(self) -> bool:
+        """所有必要服务是否都已加载完成"""
+        return all(
+            self._status[name]["state"] == "ready"
+            for name, required in self._required.items() if required
+        )
+    
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """获取各组件的加载状态"""
+        return {name: dict(status) for name, status in self._status.items()}
+
+def _create_rag_service():
+    from app.services.rag_service import RAGService
+    return RAGService()
+
+def _create_knowledge_graph_service():
+    from app.services.knowledge_graph_service import KnowledgeGraphService
+    return KnowledgeGraphService()
+
+def _create_sentiment_service():
+    from app.services.sentiment_service import SentimentService
+    return SentimentService()
+
+def _create_neo4j_service():
+    from app.services.neo4j_kg_service import kg_service
+    return kg_service
+
+# 全局实例
+service_container = ServiceContainer()
+service_container.register("rag", _create_rag_service)
+service_container.register("knowledge_graph", _create_knowledge_graph_service, required=False)
+service_container.register("sentiment", _create_sentiment_service, required=False)
+service_container.register("neo4j", _create_neo4j_service, required=False)
\ No newline at end of file
@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """合并相同的并发请求
+    
+    同一分组下键相同的调用同时到达时，只有第一个调用真正执行，其余调用等待
+    并共享它的结果（或异常）。计算在独立的任务中运行，发起者被取消不会影响
+    其他等待者；所有等待者都取消后计算才会被取消。计算结束后立即移除，
+    之后到达的调用会重新执行，因此不会返回过期结果。
+    """
+    
+    def __init__(self):
+        """初始化"""
+        self._inflight: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[str, Hashable], int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+    
+    def _group_stats(self, group: str) -> Dict[str, int]:
+        stats = self._stats.get(group)
+        if stats is None:
+            stats = self._stats[group] = {"calls": 0, "executions": 0, "coalesced": 0}
+        return stats
+    
+    async def do(self, group: str, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """执行或加入一次计算
+        
+        Args:
+            group: 分组名称，用于区分不同类型的计算并分别统计
+            key: 计算的键，需可哈希
+            func: 返回协程的无参函数，只在没有相同计算进行中时调用
+        
+        Returns:
+            计算结果
+        """
+        flight_key = (group, key)
+        stats = self._group_stats(group)
+        stats["calls"] += 1
+        
+        task = self._inflight.get(flight_key)
+        if task is None:
+            stats["executions"] += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[flight_key] = task
+            self._waiters[flight_key] = 0
+            task.add_done_callback(lambda t: self._finish(flight_key, t))
+        else:
+            stats["coalesced"] += 1
+        
+        self._waiters[flight_key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight.get(flight_key) is task:
+                self._waiters[flight_key] -= 1
+                if self._waiters[flight_key] <= 0 and not task.done():
+                    task.cancel()
+            raise
+    
+    def _finish(self, flight_key: Tuple[str, Hashable], task: asyncio.Task):
+        """计算结束后移除记录"""
+        if self._inflight.get(flight_key) is task:
+            del self._inflight[flight_key]
+            del self._waiters[flight_key]
+        # 取出异常，避免无人等待时出现未处理异常的警告
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"合并计算失败 {flight_key[0]}: {task.exception()}")
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """获取各分组的合并统计"""
+        in_flight: Dict[str, int] = {}
+        for group, _ in self._inflight:
+            in_flight[group] = in_flight.get(group, 0) + 1
+        result = {}
+        for group, stats in self._stats.items():
+            calls = stats["calls"]
+            result[group] = {
+                **stats,
+                "in_flight": in_flight.get(group, 0),
+                "coalesced_rate": stats["coalesced"] / calls if calls else 0.0
+            }
+        return result
+
+# 全局实例
+single_flight = SingleFlight()
\ No newline at end of file
@@ -1,13 +1,29 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.service_container import service_container
+from app.core.cache_manager import cache_manager
 from app.api.routes import router
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：启动后在后台预加载服务，不阻塞端口监听；关闭时释放Redis异步连接池"""
+    await cache_manager.aopen()
+    warmup_task = asyncio.create_task(service_container.warmup()) if settings.WARMUP_ON_STARTUP else None
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    await cache_manager.aclose()
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title="古诗词RAG系统",
         description="基于RAG技术的古诗词检索与分析系统",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan
     )
     
     # 添加CORS中间件
@@ -30,6 +46,15 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "healthy"}
     
+    @app.get("/ready")
+    async def readiness_check():
+        """就绪检查：返回各组件的加载状态和加载耗时，必要组件未就绪时返回503"""
+        ready = service_container.is_ready()
+        return JSONResponse(
+            status_code=200 if ready else 503,
+            content={"ready": ready, "components": service_container.status()}
+        )
+    
     return app
 
 app = create_app()
\ No newline at end of file
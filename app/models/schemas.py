@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 
 class Poem(BaseModel):
     """诗词数据模型"""
@@ -35,15 +35,40 @@ class KnowledgeGraphEdge(BaseModel):
     relation: str
     weight: float
 
+class SearchFilters(BaseModel):
+    """检索过滤条件：同一字段的多个取值满足其一即可，不同字段需同时满足"""
+    dynasty: Optional[List[str]] = None
+    author: Optional[List[str]] = None
+    theme: Optional[List[str]] = None
+    emotions: Optional[List[str]] = None
+    
+    def to_dict(self) -> Dict[str, List[str]]:
+        """转换为 {字段: 取值列表}，省略未设置或为空的字段"""
+        return {field: values for field, values in self.model_dump().items() if values}
+
 class QueryRequest(BaseModel):
     """查询请求模型"""
     query: str
     top_k: int = 5
     use_rag: bool = True
+    search_mode: Optional[Literal["vector", "keyword", "hybrid"]] = None  # 默认取配置 SEARCH_MODE
+    filters: Optional[SearchFilters] = None
 
 class QueryResponse(BaseModel):
     """查询响应模型"""
     results: List[SearchResult]
     knowledge_graph: Optional[Dict[str, List]] = None
     sentiment_analysis: Optional[Dict[str, Any]] = None
-    generated_answer: Optional[str] = None
\ No newline at end of file
+    generated_answer: Optional[str] = None
+
+class BatchQueryRequest(BaseModel):
+    """批量查询请求模型"""
+    queries: List[str]
+    top_k: int = 5
+    use_rag: bool = True
+    search_mode: Optional[Literal["vector", "keyword", "hybrid"]] = None  # 默认取配置 SEARCH_MODE
+    filters: Optional[SearchFilters] = None
+
+class BatchQueryResponse(BaseModel):
+    """批量查询响应模型，顺序与请求中的查询一致"""
+    responses: List[QueryResponse]
\ No newline at end of file
@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from app.core.cache_manager import cache_manager
+from app.core.lru_cache import LRUCache
+from app.services.embedding_cache import normalize_query
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Redis中答案缓存键的前缀
+REDIS_KEY_PREFIX = "rag_answer:"
+
+# 每组检索结果保留的相似查询数
+MAX_QUERIES_PER_GROUP = 32
+
+class AnswerCache:
+    """生成答案缓存
+    
+    精确层：键为提示版本、归一化查询和检索到的诗词ID集合，先查进程内LRU，
+    再查Redis（多进程共享）。相似层：同一组诗词ID下保存最近的查询向量，
+    新查询与其中某条的余弦相似度达到阈值时直接复用该答案，用于覆盖换个
+    说法的重复提问。
+    """
+    
+    def __init__(self, prompt_version: str, maxsize: int = 2000, ttl: int = 86400,
+                 similarity_threshold: float = 0.95):
+        """初始化答案缓存
+        
+        Args:
+            prompt_version: 提示模板及模型版本，参与缓存键，变化后旧答案自动失效
+            maxsize: 进程内缓存的最大条目数（精确层和相似层分别计）
+            ttl: Redis中答案的过期时间（秒）
+            similarity_threshold: 相似层的余弦相似度阈值，大于1时关闭相似层
+        """
+        self.prompt_version = prompt_version
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.exact = LRUCache(maxsize)
+        self.groups = LRUCache(maxsize)
+        self._lock = threading.Lock()
+        self._similar_hits = 0
+    
+    def _group_key(self, poem_ids: Sequence[str]) -> str:
+        """检索结果分组键：提示版本与诗词ID集合"""
+        return f"{self.prompt_version}\x1f{','.join(sorted(set(poem_ids)))}"
+    
+    def _exact_key(self, query: str, poem_ids: Sequence[str]) -> str:
+        """精确层缓存键"""
+        raw = f"{self._group_key(poem_ids)}\x1f{normalize_query(query)}"
+        return REDIS_KEY_PREFIX + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> Optional[np.ndarray]:
+        """归一化查询向量"""
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+    
+    def get(self, query: str, poem_ids: Sequence[str],
+            query_vector: Optional[Sequence[float]] = None) -> Optional[str]:
+        """查找缓存答案，未命中时返回None"""
+        key = self._exact_key(query, poem_ids)
+        answer = self.exact.get(key)
+        if answer is not None:
+            return answer
+        
+        answer = cache_manager.get(key)
+        if answer is not None:
+            self.exact.set(key, answer)
+            return answer
+        
+        if query_vector is None or self.similarity_threshold > 1:
+            return None
+        unit = self._unit(query_vector)
+        entries = self.groups.get(self._group_key(poem_ids))
+        if unit is None or not entries:
+            return None
+        
+        with self._lock:
+            vectors = np.stack([vector for vector, _ in entries])
+            answers = [answer for _, answer in entries]
+        similarities = vectors @ unit
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        
+        with self._lock:
+            self._similar_hits += 1
+        logger.info(f"相似查询命中答案缓存，相似度{similarities[best]:.3f}")
+        return answers[best]
+    
+    def set(self, query: str, poem_ids: Sequence[str], answer: str,
+            query_vector: Optional[Sequence[float]] = None):
+        """缓存答案"""
+        key = self._exact_key(query, poem_ids)
+        self.exact.set(key, answer)
+        cache_manager.set(key, answer, self.ttl)
+        
+        if query_vector is None or self.similarity_threshold > 1:
+            return
+        unit = self._unit(query_vector)
+        if unit is None:
+            return
+        group_key = self._group_key(poem_ids)
+        with self._lock:
+            entries: List = self.groups.get(group_key) or []
+            entries = (entries + [(unit, answer)])[-MAX_QUERIES_PER_GROUP:]
+            self.groups.set(group_key, entries)
+    
+    def stats(self) -> Dict[str, object]:
+        """获取缓存统计信息"""
+        return {
+            "prompt_version": self.prompt_version,
+            "exact": self.exact.stats(),
+            "similar_hits": self._similar_hits,
+            "similarity_threshold": self.similarity_threshold
+        }
\ No newline at end of file
@@ -1,9 +1,9 @@
 import asyncio
 import logging
 from typing import List, Dict, Any
+from app.core.config import settings
 from app.core.cache_manager import cache_manager
-from app.services.neo4j_kg_service import kg_service
-from app.services.rag_service import RAGService
+from app.core.service_container import service_container
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -12,20 +12,16 @@ logger = logging.getLogger(__name__)
 class CacheWarmupService:
     """缓存预热服务"""
     
-    def __init__(self):
-        """初始化缓存预热服务"""
-        self.rag_service = RAGService()
-        self.neo4j_service = kg_service
-    
     async def warmup_common_queries(self):
         """预热常见查询的缓存"""
         logger.info("开始缓存预热...")
+        neo4j_service = await service_container.aget("neo4j")
         
         # 预热热门诗人信息
         popular_poets = ["李白", "杜甫", "白居易", "王维", "苏轼", "辛弃疾"]
         for poet in popular_poets:
             try:
-                await self.neo4j_service.get_poet_info(poet)
+                await neo4j_service.get_poet_info(poet)
                 logger.info(f"预热诗人信息缓存: {poet}")
             except Exception as e:
                 logger.warning(f"预热诗人 {poet} 信息失败: {e}")
@@ -34,7 +30,7 @@ class CacheWarmupService:
         popular_themes = ["思乡", "离别", "爱情", "山水", "哲理", "咏史"]
         for theme in popular_themes:
             try:
-                await self.neo4j_service.search_poems_by_theme(theme, limit=5)
+                await neo4j_service.search_poems_by_theme(theme, limit=5)
                 logger.info(f"预热主题搜索缓存: {theme}")
             except Exception as e:
                 logger.warning(f"预热主题 {theme} 搜索失败: {e}")
@@ -43,14 +39,14 @@ class CacheWarmupService:
         popular_emotions = ["思念", "愉悦", "忧愁", "愤怒", "感慨"]
         for emotion in popular_emotions:
             try:
-                await self.neo4j_service.get_poems_by_emotion(emotion, limit=5)
+                await neo4j_service.get_poems_by_emotion(emotion, limit=5)
                 logger.info(f"预热情感搜索缓存: {emotion}")
             except Exception as e:
                 logger.warning(f"预热情感 {emotion} 搜索失败: {e}")
         
         # 预热知识图谱统计信息
         try:
-            await self.neo4j_service.get_knowledge_graph_statistics()
+            await neo4j_service.get_knowledge_graph_statistics()
             logger.info("预热知识图谱统计信息缓存")
         except Exception as e:
             logger.warning(f"预热知识图谱统计信息失败: {e}")
@@ -60,6 +56,7 @@ class CacheWarmupService:
     async def warmup_rag_searches(self):
         """预热RAG搜索缓存"""
         logger.info("开始RAG搜索缓存预热...")
+        rag_service = await service_container.aget("rag")
         
         # 预热常见搜索查询
         common_queries = [
@@ -72,13 +69,13 @@ class CacheWarmupService:
         
         for query in common_queries:
             try:
-                # 预热搜索结果
-                results = await self.rag_service.async_search(query, top_k=3)
+                # 预热搜索结果，参数与查询接口默认值一致，答案缓存键才能命中
+                results = await rag_service.async_search(query, top_k=settings.TOP_K_RESULTS)
                 logger.info(f"预热RAG搜索缓存: {query}")
                 
-                # 预热生成的答案
+                # 预热生成的答案，结果写入答案缓存
                 if results:
-                    await self.rag_service.async_generate_answer(query, results[:2])
+                    await rag_service.async_generate_answer(query, results)
                     logger.info(f"预热RAG答案生成缓存: {query}")
             except Exception as e:
                 logger.warning(f"预热RAG搜索 {query} 失败: {e}")
@@ -0,0 +1,117 @@
+import re
+import sys
+import logging
+from typing import List, Set, Tuple
+from app.models.schemas import SearchResult
+from app.utils.tokens import estimate_tokens
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 按句切分，句末标点保留在句中
+SENTENCE_PATTERN = re.compile(r"[^。！？；!?;\n]+[。！？；!?;]*")
+
+def split_sentences(text: str) -> List[str]:
+    """将诗词正文或译文切分为句子"""
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.findall(text or "") if sentence.strip()]
+
+class ContextBuilder:
+    """按token预算组装答案生成的上下文
+    
+    检索结果按相关度排列，依次放入标题、作者、朝代和正文，预算将尽时正文按句截断；
+    剩余预算连第一句也放不下时截取该句的开头，而不是整首跳过。正文放完后，再用剩余预算按相关度补充译文，
+    因此预算不足时最先舍弃的是译文。不同诗词中重复出现的句子只保留第一次。
+    token数用本地估算，不调用分词器。
+    """
+    
+    def __init__(self, max_tokens: int):
+        """初始化
+        
+        Args:
+            max_tokens: 上下文的token预算，不大于0时不限制
+        """
+        self.max_tokens = max_tokens if max_tokens > 0 else sys.maxsize
+    
+    @staticmethod
+    def _truncate(sentence: str, budget: int) -> str:
+        """截取句子开头在预算内的最长部分，一个字也放不下时返回空串"""
+        low, high = 0, len(sentence)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(sentence[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return sentence[:low]
+    
+    @classmethod
+    def _take(cls, sentences: List[str], seen: Set[str], budget: int) -> Tuple[List[str], int]:
+        """在预算内依次选取未出现过的句子，返回选中的句子及其token数
+        
+        第一句就超出预算时截取其开头，之后的句子超出预算即停止。
+        """
+        kept = []
+        used = 0
+        for sentence in sentences:
+            if sentence in seen:
+                continue
+            cost = estimate_tokens(sentence)
+            if used + cost > budget:
+                head = cls._truncate(sentence, budget) if not kept else ""
+                if head:
+                    kept.append(head)
+                    seen.add(sentence)
+                    used += estimate_tokens(head)
+                break
+            kept.append(sentence)
+            seen.add(sentence)
+            used += cost
+        return kept, used
+    
+    def build(self, results: List[SearchResult]) -> Tuple[str, int]:
+        """组装上下文，返回 (上下文文本, 估算token数)"""
+        seen: Set[str] = set()
+        entries = []
+        used = 0
+        
+        # 第一轮：按相关度放入各诗词的基本信息和正文
+        for result in results:
+            poem = result.poem
+            header = f"诗词: {poem.title}\n作者: {poem.author}\n朝代: {poem.dynasty}"
+            # 计入正文标签和诗词之间的分隔
+            header_cost = estimate_tokens(f"{header}\n内容: \n\n")
+            if used + header_cost >= self.max_tokens:
+                break
+            content, content_cost = self._take(split_sentences(poem.content), seen, self.max_tokens - used - header_cost)
+            if not content:
+                # 正文与已选诗词完全重复，或剩余预算一个字也放不下
+                continue
+            entries.append([poem, header, content, []])
+            used += header_cost + content_cost
+        
+        # 第二轮：用剩余预算按相关度补充译文
+        label_cost = estimate_tokens("\n译文: ")
+        for entry in entries:
+            if used + label_cost >= self.max_tokens:
+                break
+            translation, translation_cost = self._take(
+                split_sentences(entry[0].translation), seen, self.max_tokens - used - label_cost
+            )
+            if translation:
+                entry[3] = translation
+                used += label_cost + translation_cost
+        
+        blocks = []
+        for _, header, content, translation in entries:
+            block = f"{header}\n内容: {''.join(content)}"
+            if translation:
+                block += f"\n译文: {''.join(translation)}"
+            blocks.append(block)
+        context = "\n\n".join(blocks)
+        
+        tokens = estimate_tokens(context)
+        budget = "不限" if self.max_tokens == sys.maxsize else self.max_tokens
+        logger.info(f"答案上下文: {len(entries)}/{len(results)}首诗词, "
+                    f"译文{sum(1 for entry in entries if entry[3])}条, 约{tokens} tokens（预算{budget}）")
+        return context, tokens
\ No newline at end of file
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import logging
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from app.core.lru_cache import LRUCache
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 批量读取时每条 IN 查询的键数，旧版SQLite单条语句最多绑定999个参数
+SQLITE_QUERY_CHUNK = 200
+
+def normalize_query(text: str) -> str:
+    """归一化查询文本：全角转半角、去除首尾空白、合并连续空白并转小写"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).lower()
+
+class PersistentEmbeddingStore:
+    """基于SQLite的持久化向量存储，向量以float32二进制保存"""
+    
+    def __init__(self, path: str):
+        """打开（或创建）向量存储文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """批量读取向量，按 SQLITE_QUERY_CHUNK 分块查询"""
+        keys = list(dict.fromkeys(keys))
+        rows = []
+        with self._lock:
+            for start in range(0, len(keys), SQLITE_QUERY_CHUNK):
+                chunk = keys[start:start + SQLITE_QUERY_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT key, vector FROM query_embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+        return {key: array("f", blob).tolist() for key, blob in rows}
+    
+    def set_many(self, items: Dict[str, List[float]]):
+        """批量写入向量"""
+        if not items:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+            self._conn.commit()
+    
+    def close(self):
+        """关闭存储"""
+        with self._lock:
+            self._conn.close()
+
+class CachedQueryEmbeddings(Embeddings):
+    """带缓存的查询向量化
+    
+    缓存键为嵌入模型名与归一化后的查询文本。先查进程内LRU，再查SQLite持久层，
+    两级都未命中时才调用底层嵌入模型，且同一批次的未命中文本合并为一次调用。
+    """
+    
+    def __init__(self, embeddings: Embeddings, model_name: str, maxsize: int = 5000,
+                 persist_path: Optional[str] = None):
+        """初始化查询向量缓存
+        
+        Args:
+            embeddings: 底层嵌入模型
+            model_name: 嵌入模型名称，参与缓存键，切换模型后旧向量自动失效
+            maxsize: 进程内LRU缓存的最大条目数
+            persist_path: 持久化缓存文件路径，为空时只使用进程内缓存
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.memory_cache = LRUCache(maxsize)
+        self.store = None
+        if persist_path:
+            try:
+                self.store = PersistentEmbeddingStore(persist_path)
+            except Exception as e:
+                logger.warning(f"持久化向量缓存打开失败，仅使用内存缓存: {e}")
+    
+    def _cache_key(self, text: str) -> str:
+        """生成缓存键"""
+        return f"{self.model_name}\x1f{normalize_query(text)}"
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量获取查询向量"""
+        keys = [self._cache_key(text) for text in texts]
+        vectors: Dict[str, List[float]] = {}
+        
+        # 第一级：进程内LRU
+        for key in keys:
+            vector = self.memory_cache.get(key)
+            if vector is not None:
+                vectors[key] = vector
+        
+        # 第二级：持久化存储
+        missing = list(dict.fromkeys(key for key in keys if key not in vectors))
+        if missing and self.store:
+            try:
+                stored = self.store.get_many(missing)
+            except Exception as e:
+                logger.warning(f"读取持久化向量缓存失败: {e}")
+                stored = {}
+            for key, vector in stored.items():
+                self.memory_cache.set(key, vector)
+                vectors[key] = vector
+            missing = [key for key in missing if key not in stored]
+        
+        # 都未命中时一次性调用嵌入模型
+        if missing:
+            first_text = {}
+            for key, text in zip(keys, texts):
+                first_text.setdefault(key, text)
+            embedded = self.embeddings.embed_documents([first_text[key] for key in missing])
+            new_vectors = dict(zip(missing, embedded))
+            for key, vector in new_vectors.items():
+                self.memory_cache.set(key, vector)
+            vectors.update(new_vectors)
+            if self.store:
+                try:
+                    self.store.set_many(new_vectors)
+                except Exception as e:
+                    logger.warning(f"写入持久化向量缓存失败: {e}")
+        
+        return [vectors[key] for key in keys]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """获取单个查询向量"""
+        return self.embed_documents([text])[0]
+    
+    def stats(self) -> Dict[str, object]:
+        """获取缓存统计信息"""
+        return {
+            "model": self.model_name,
+            "memory": self.memory_cache.stats(),
+            "persistent": self.store is not None
+        }
\ No newline at end of file
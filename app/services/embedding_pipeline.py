@@ -0,0 +1,213 @@
+import os
+import time
+import random
+import shutil
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from app.utils.tokens import estimate_tokens
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 重试退避的基础等待和最长等待（秒）
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+class TokenRateLimiter:
+    """令牌桶限速器，按每分钟token预算控制请求发送速率"""
+    
+    def __init__(self, tokens_per_minute: int):
+        """初始化限速器，tokens_per_minute 不大于0时不限速"""
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, tokens: int):
+        """等待直到预算足够发送 tokens 个token"""
+        if self.capacity <= 0:
+            return
+        # 单批超过整桶容量时，最多等到桶满
+        tokens = min(float(tokens), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) / self.rate)
+
+class EmbeddingCheckpoint:
+    """批次级检查点
+    
+    每个完成的批次保存为一个 .npy 文件，文件名由模型名和批内全部文本计算，
+    与批次在输入中的位置无关：输入分多次向量化时，中断后重新运行同样能跳过
+    已完成的批次，内容变化的批次自然不会命中。
+    """
+    
+    def __init__(self, path: str, model_name: str):
+        """打开（或创建）检查点目录"""
+        self.path = path
+        self.model_name = model_name
+        os.makedirs(path, exist_ok=True)
+    
+    def _batch_file(self, texts: List[str]) -> str:
+        digest = hashlib.sha256(self.model_name.encode("utf-8"))
+        for text in texts:
+            digest.update(b"\x1e")
+            digest.update(text.encode("utf-8"))
+        return os.path.join(self.path, f"batch-{digest.hexdigest()}.npy")
+    
+    def load(self, texts: List[str]) -> Optional[np.ndarray]:
+        """读取已完成批次的向量，不存在时返回None"""
+        batch_file = self._batch_file(texts)
+        if not os.path.exists(batch_file):
+            return None
+        return np.load(batch_file)
+    
+    def save(self, texts: List[str], vectors: np.ndarray):
+        """保存批次向量，先写临时文件再重命名，避免中断时留下残缺文件"""
+        batch_file = self._batch_file(texts)
+        tmp_file = batch_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp_file, batch_file)
+
+class EmbeddingPipeline:
+    """批量向量化流水线
+    
+    文本按批分组后并发调用嵌入模型，同时受并发数和每分钟token预算约束；
+    大规模构建通过 aembed_stream 逐组送入文本，整个构建共用一个令牌桶；
+    失败的批次按指数退避重试，完成的批次写入检查点，进程中断后重新运行
+    会跳过已完成的批次。检查点在整个构建完成后由调用方通过 clear_checkpoint
+    删除。运行过程中输出吞吐量。
+    """
+    
+    def __init__(self, embeddings: Embeddings, model_name: str = "",
+                 batch_size: int = 64, max_concurrency: int = 4, tokens_per_minute: int = 0,
+                 max_retries: int = 5, checkpoint_dir: Optional[str] = None):
+        """初始化向量化流水线
+        
+        Args:
+            embeddings: 底层嵌入模型
+            model_name: 嵌入模型名称，参与检查点文件名
+            batch_size: 每批文本数
+            max_concurrency: 最大并发请求数
+            tokens_per_minute: 每分钟token预算，不大于0时不限速
+            max_retries: 单批最大重试次数
+            checkpoint_dir: 检查点目录，为空时不保存检查点
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.checkpoint_dir = checkpoint_dir
+    
+    async def _embed_batch(self, batch_index: int, texts: List[str]) -> np.ndarray:
+        """向量化单个批次，失败时指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = await self.embeddings.aembed_documents(texts)
+                return np.array(vectors, dtype=np.float32)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"第 {batch_index} 批向量化失败（第{attempt + 1}次），{delay:.1f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+    
+    async def _embed_group(self, texts: List[str], checkpoint: Optional[EmbeddingCheckpoint],
+                           semaphore: asyncio.Semaphore, limiter: TokenRateLimiter,
+                           progress: Dict[str, Any]) -> np.ndarray:
+        """向量化一组文本，组内按批并发，返回与输入顺序一致的向量矩阵"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results: List[Optional[np.ndarray]] = [None] * len(batches)
+        if checkpoint:
+            for i, batch in enumerate(batches):
+                results[i] = checkpoint.load(batch)
+        pending = [i for i, vectors in enumerate(results) if vectors is None]
+        if len(pending) < len(batches):
+            logger.info(f"从检查点恢复 {len(batches) - len(pending)}/{len(batches)} 批")
+        
+        async def run(batch_index: int):
+            batch = batches[batch_index]
+            async with semaphore:
+                await limiter.acquire(sum(estimate_tokens(text) for text in batch))
+                vectors = await self._embed_batch(batch_index, batch)
+            results[batch_index] = vectors
+            if checkpoint:
+                checkpoint.save(batch, vectors)
+            
+            progress["batches"] += 1
+            progress["texts"] += len(batch)
+            elapsed = time.perf_counter() - progress["start_time"]
+            logger.info(f"向量化进度: 已完成 {progress['batches']} 批, "
+                        f"{progress['texts'] / max(elapsed, 1e-6):.1f} 条/秒")
+        
+        # 某批最终失败时其余批次仍会完成并写入检查点，下次运行从断点继续
+        outcomes = await asyncio.gather(*(run(i) for i in pending), return_exceptions=True)
+        errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+        if errors:
+            raise errors[0]
+        return np.vstack(results)
+    
+    async def aembed_stream(self, groups: Iterable[List[str]]) -> AsyncIterator[np.ndarray]:
+        """流式批量向量化，逐组产出与该组文本顺序一致的向量矩阵
+        
+        整个流共用一个限速器、并发上限和进度统计，每分钟token预算跨组生效；
+        组在上一组的向量被取走后才读取，同一时刻只有一组文本及其向量在内存中。
+        """
+        checkpoint = EmbeddingCheckpoint(self.checkpoint_dir, self.model_name) if self.checkpoint_dir else None
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = TokenRateLimiter(self.tokens_per_minute)
+        progress = {"batches": 0, "texts": 0, "start_time": time.perf_counter()}
+        total = 0
+        
+        for texts in groups:
+            total += len(texts)
+            yield await self._embed_group(texts, checkpoint, semaphore, limiter, progress)
+        
+        elapsed = time.perf_counter() - progress["start_time"]
+        logger.info(f"向量化完成: {total} 条文本, 新生成 {progress['batches']} 批, 耗时{elapsed:.1f}秒")
+    
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """异步批量向量化，返回与输入顺序一致的向量矩阵"""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        results = [vectors async for vectors in self.aembed_stream([texts])]
+        return results[0]
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """同步批量向量化"""
+        return asyncio.run(self.aembed(texts))
+    
+    def clear_checkpoint(self):
+        """删除检查点，在向量化结果已持久保存后调用"""
+        if self.checkpoint_dir:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+def create_embedding_pipeline(embeddings: Embeddings, model_name: str) -> EmbeddingPipeline:
+    """根据配置创建批量向量化流水线"""
+    return EmbeddingPipeline(
+        embeddings,
+        model_name=model_name,
+        batch_size=settings.EMBEDDING_BATCH_SIZE,
+        max_concurrency=settings.EMBEDDING_MAX_CONCURRENCY,
+        tokens_per_minute=settings.EMBEDDING_TOKENS_PER_MINUTE,
+        max_retries=settings.EMBEDDING_MAX_RETRIES,
+        checkpoint_dir=settings.EMBEDDING_CHECKPOINT_DIR or None
+    )
\ No newline at end of file
@@ -0,0 +1,111 @@
+import zlib
+import logging
+from typing import List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+from app.utils.text_index import extract_ngrams
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HashingEmbeddings(Embeddings):
+    """确定性哈希向量化
+    
+    将字符一元组和二元组通过CRC32哈希到固定维度（带符号），再做L2归一化。
+    不需要模型文件和网络，结果跨进程稳定，适合测试和离线基准测试。
+    """
+    
+    def __init__(self, dim: int = 512):
+        """初始化哈希向量化器"""
+        self.dim = dim
+    
+    def _embed(self, text: str) -> List[float]:
+        """向量化单条文本"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram in extract_ngrams(text):
+            h = zlib.crc32(gram.encode("utf-8"))
+            # 二元组比一元组更有区分度
+            weight = 1.0 if len(gram) == 1 else 2.0
+            vector[h % self.dim] += weight if (h >> 31) & 1 else -weight
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量向量化文档"""
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        """向量化查询"""
+        return self._embed(text)
+
+class LocalSentenceTransformerEmbeddings(Embeddings):
+    """本地sentence-transformers嵌入模型，在CPU上批量编码"""
+    
+    def __init__(self, model_name: str, batch_size: int = 64, device: str = "cpu"):
+        """加载本地嵌入模型"""
+        from sentence_transformers import SentenceTransformer
+        
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量向量化文档"""
+        if not texts:
+            return []
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        """向量化查询"""
+        return self.embed_documents([text])[0]
+
+def embedding_model_name(backend: Optional[str] = None) -> str:
+    """获取当前嵌入后端对应的模型标识，用于缓存键和索引元数据"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "local":
+        return settings.LOCAL_EMBEDDING_MODEL
+    if backend == "hashing":
+        return f"hashing-{settings.HASHING_EMBEDDING_DIM}"
+    return settings.EMBEDDING_MODEL
+
+def create_embeddings(backend: Optional[str] = None, **openai_options) -> Embeddings:
+    """根据配置创建嵌入模型
+    
+    Args:
+        backend: openai（远程API）、local（本地sentence-transformers模型）或
+            hashing（确定性哈希向量化），默认取 EMBEDDING_BACKEND 配置
+        **openai_options: 传给 OpenAIEmbeddings 的额外参数
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    
+    if backend == "hashing":
+        return HashingEmbeddings(dim=settings.HASHING_EMBEDDING_DIM)
+    
+    if backend == "local":
+        logger.info(f"加载本地嵌入模型: {settings.LOCAL_EMBEDDING_MODEL}")
+        return LocalSentenceTransformerEmbeddings(
+            settings.LOCAL_EMBEDDING_MODEL,
+            batch_size=settings.EMBEDDING_BATCH_SIZE
+        )
+    
+    if backend != "openai":
+        raise ValueError(f"不支持的嵌入后端: {backend}")
+    
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_api_base=settings.OPENAI_API_BASE,
+        model=settings.EMBEDDING_MODEL,
+        **openai_options
+    )
\ No newline at end of file
@@ -1,13 +1,16 @@
 import asyncio
 import logging
+import time
 from typing import Dict, Any, List, Optional
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+from langchain_core.embeddings import Embeddings
+from langchain_openai import ChatOpenAI
 from langchain_community.vectorstores import FAISS
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from app.core.config import settings
 from app.models.schemas import Poem, SearchResult
+from app.services.embedding_service import create_embeddings, embedding_model_name
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -22,19 +25,19 @@ class ModelOptimizationService:
         self.model_cache = {}
         self.prompt_cache = {}
         
-    def get_optimized_embeddings(self) -> OpenAIEmbeddings:
+    def get_optimized_embeddings(self) -> Embeddings:
         """获取优化的嵌入模型"""
-        cache_key = f"embeddings_{settings.EMBEDDING_MODEL}"
+        cache_key = f"embeddings_{settings.EMBEDDING_BACKEND}_{embedding_model_name()}"
         
         if cache_key not in self.embeddings_cache:
-            self.embeddings_cache[cache_key] = OpenAIEmbeddings(
-                openai_api_key=settings.OPENAI_API_KEY,
-                openai_api_base=settings.OPENAI_API_BASE,
-                model=settings.EMBEDDING_MODEL,
-                # 优化参数
-                chunk_size=1000,  # 增加批处理大小
-                max_retries=3,    # 增加重试次数
-            )
+            if settings.EMBEDDING_BACKEND == "openai":
+                self.embeddings_cache[cache_key] = create_embeddings(
+                    # 优化参数
+                    chunk_size=1000,  # 增加批处理大小
+                    max_retries=3,    # 增加重试次数
+                )
+            else:
+                self.embeddings_cache[cache_key] = create_embeddings()
             
         return self.embeddings_cache[cache_key]
     
@@ -119,8 +122,9 @@ class ModelOptimizationService:
         """获取模型性能配置"""
         return {
             "embedding_model": {
-                "model_name": settings.EMBEDDING_MODEL,
-                "batch_size": 1000,
+                "backend": settings.EMBEDDING_BACKEND,
+                "model_name": embedding_model_name(),
+                "batch_size": 1000 if settings.EMBEDDING_BACKEND == "openai" else settings.EMBEDDING_BATCH_SIZE,
                 "max_retries": 3,
                 "timeout": 30
             },
@@ -139,8 +143,13 @@ class ModelOptimizationService:
             }
         }
     
-    async def benchmark_models(self) -> Dict[str, Any]:
-        """基准测试模型性能"""
+    async def benchmark_models(self, batch_samples: int = 0) -> Dict[str, Any]:
+        """基准测试模型性能
+        
+        Args:
+            batch_samples: 批量向量化吞吐量测试的文本数，默认为0即不测试；
+                使用付费嵌入API时每次测试都会产生费用，需要时显式指定
+        """
         results = {
             "embeddings": {},
             "language_models": {}
@@ -159,6 +168,14 @@ class ModelOptimizationService:
             results["embeddings"]["avg_response_time"] = (end_time - start_time) / len(test_texts)
             results["embeddings"]["test_samples"] = len(test_texts)
             
+            # 测试批量向量化吞吐量（按需开启）
+            if batch_samples > 0:
+                batch_texts = [test_texts[i % len(test_texts)] for i in range(batch_samples)]
+                batch_start = time.perf_counter()
+                await asyncio.get_event_loop().run_in_executor(None, embeddings.embed_documents, batch_texts)
+                batch_elapsed = time.perf_counter() - batch_start
+                results["embeddings"]["batch_throughput"] = len(batch_texts) / batch_elapsed if batch_elapsed > 0 else 0.0
+            
             # 测试语言模型性能
             llm = self.get_optimized_llm()
             test_prompt = self.get_optimized_prompt()
@@ -50,6 +50,12 @@ class AsyncNeo4jKnowledgeGraphService:
     @cache_manager.cache(ttl=86400)  # 缓存24小时
     async def build_knowledge_graph(self, poems_data: List[Dict]) -> bool:
         """构建知识图谱"""
+        if not await self.prepare_knowledge_graph():
+            return False
+        return await self.ingest_poems(poems_data)
+    
+    async def prepare_knowledge_graph(self) -> bool:
+        """清空现有数据并创建索引，之后可通过 ingest_poems 分批导入诗词"""
         try:
             async with self.neo4j_driver.session() as session:
                 # 清空现有数据
@@ -63,6 +69,16 @@ class AsyncNeo4jKnowledgeGraphService:
                 await session.run("CREATE INDEX IF NOT EXISTS FOR (e:Emotion) ON (e.name)")
                 await session.run("CREATE INDEX IF NOT EXISTS FOR (i:Image) ON (i.name)")
                 
+                return True
+        
+        except Exception as e:
+            logger.error(f"初始化知识图谱失败: {e}")
+            return False
+    
+    async def ingest_poems(self, poems_data: List[Dict]) -> bool:
+        """导入一批诗词，可多次调用"""
+        try:
+            async with self.neo4j_driver.session() as session:
                 # 批量创建节点和关系
                 for poem_data in poems_data:
                     # 创建诗人节点
@@ -165,7 +181,7 @@ class AsyncNeo4jKnowledgeGraphService:
                 return True
                 
         except Exception as e:
-            logger.error(f"构建知识图谱失败: {e}")
+            logger.error(f"导入诗词到知识图谱失败: {e}")
             return False
     
     @cache_manager.cache(ttl=3600)  # 缓存1小时
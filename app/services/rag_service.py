@@ -1,14 +1,39 @@
-import os
-import json
-from typing import List, Dict
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_community.vectorstores import FAISS
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Tuple, Optional
+import numpy as np
+import faiss
+from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
+from langchain_core.documents import Document
 from app.core.config import settings
 from app.core.async_service import async_service
 from app.models.schemas import Poem, SearchResult
+from app.utils.text_index import CharNgramIndex
+from app.utils.poem_store import PoemStore, load_poem_store
+from app.utils.rank_fusion import reciprocal_rank_fusion, normalized_score_fusion
+from app.services.reranker_service import create_reranker
+from app.services.embedding_cache import CachedQueryEmbeddings
+from app.services.answer_cache import AnswerCache
+from app.services.context_builder import ContextBuilder
+from app.services.embedding_service import create_embeddings, embedding_model_name
+from app.utils.faiss_index import filtered_search, load_index_params
+from app.utils.metadata_bitmaps import MetadataBitmaps, matches_metadata
+from app.utils.vector_store_io import current_index_dir, load_vector_store
+
+# 答案生成提示模板版本，修改模板时递增，使缓存的旧答案失效
+ANSWER_PROMPT_VERSION = "2"
+
+# 答案生成提示模板
+ANSWER_PROMPT_TEMPLATE = """你是一个古诗词专家，请根据以下诗词信息回答用户的问题。
+
+相关诗词信息:
+{context}
+
+用户问题: {question}
+
+请用简洁明了的语言回答，适合初中生理解。"""
 
 class RAGService:
     """RAG核心服务"""
@@ -16,9 +41,14 @@ class RAGService:
     def __init__(self):
         """初始化RAG服务"""
         # 初始化嵌入模型
-        self.embeddings = OpenAIEmbeddings(
-            openai_api_key=settings.OPENAI_API_KEY,
-            openai_api_base=settings.OPENAI_API_BASE
+        self.embeddings = create_embeddings()
+        
+        # 查询向量缓存
+        self.query_embeddings = CachedQueryEmbeddings(
+            self.embeddings,
+            model_name=embedding_model_name(),
+            maxsize=settings.EMBEDDING_CACHE_SIZE,
+            persist_path=settings.EMBEDDING_CACHE_PATH
         )
         
         # 初始化语言模型
@@ -29,6 +59,23 @@ class RAGService:
             temperature=0.7
         )
         
+        # 答案生成链只构建一次，各请求复用
+        self.answer_chain = self._create_answer_chain()
+        
+        # 按token预算组装上下文
+        self.context_builder = ContextBuilder(settings.ANSWER_CONTEXT_MAX_TOKENS)
+        
+        # 限制同时进行的LLM调用数，与CPU任务使用的线程池相互独立
+        self._llm_semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        
+        # 生成答案缓存
+        self.answer_cache = AnswerCache(
+            prompt_version=f"{ANSWER_PROMPT_VERSION}:{settings.OPENAI_MODEL}",
+            maxsize=settings.ANSWER_CACHE_SIZE,
+            ttl=settings.ANSWER_CACHE_TTL,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY
+        )
+        
         # 加载向量数据库
         self.vector_store = self._load_vector_store()
         
@@ -36,13 +83,25 @@ class RAGService:
         self._init_reranker()
         
         # 加载诗词数据
-        self.poems_data = self._load_poems_data()
+        self.poem_store = self._load_poem_store()
+        
+        # 混合检索时向量检索在独立线程中与关键词检索并行执行
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=4)
     
     def _load_vector_store(self):
-        """加载向量数据库"""
+        """加载向量数据库及其索引参数、元数据位图"""
+        self.index_params = {}
+        self.metadata_bitmaps = None
         try:
-            if os.path.exists(settings.VECTOR_DB_PATH):
-                return FAISS.load_local(settings.VECTOR_DB_PATH, self.embeddings, allow_dangerous_deserialization=True)
+            # 先确定当前版本目录，保证三者来自同一版本
+            index_dir = current_index_dir(settings.VECTOR_DB_PATH)
+            vector_store = load_vector_store(index_dir, self.embeddings)
+            if vector_store is not None:
+                self.index_params = load_index_params(index_dir)
+                self.metadata_bitmaps = MetadataBitmaps.load(index_dir)
+                if self.metadata_bitmaps is None:
+                    print("向量数据库没有元数据位图，过滤检索将在结果中筛选，建议重新运行 process_data.py")
+                return vector_store
             else:
                 # 创建新的向量数据库
                 return self._create_vector_store()
@@ -58,132 +117,383 @@ class RAGService:
     
     def _init_reranker(self):
         """初始化重排序器"""
-        # TODO: 实现重排序逻辑
-        pass
+        self.reranker = create_reranker()
+    
+    def _load_poem_store(self) -> PoemStore:
+        """加载诗词数据到列式存储"""
+        # 与构建关键词索引时读取同一组原始数据文件
+        store = load_poem_store(settings.RAW_DATA_PATH)
+        
+        # 加载关键词倒排索引
+        self.keyword_index = self._load_keyword_index(store)
+        # 关键词索引行号到诗词存储行号的映射，用于按元数据过滤
+        self._keyword_store_rows = np.array(
+            [store.row_of(doc_id) for doc_id in self.keyword_index.doc_ids], dtype=np.int64
+        )
+        
+        return store
     
-    def _load_poems_data(self) -> Dict[str, dict]:
-        """加载诗词数据"""
+    def _load_keyword_index(self, store: PoemStore) -> CharNgramIndex:
+        """加载预构建的关键词倒排索引，不可用或已过期时重新构建"""
+        try:
+            index = CharNgramIndex.load(settings.KEYWORD_INDEX_PATH)
+            # 行号必须与诗词数据的顺序一致
+            if index is not None and index.doc_ids == [store.ids[row] for row in store.live_rows()]:
+                return index
+        except Exception as e:
+            print(f"加载关键词索引失败: {e}")
+        
+        return CharNgramIndex.build(store.records())
+    
+    def _keyword_search(self, query: str, limit: int,
+                        filters: Optional[Dict[str, List[str]]] = None) -> List[Tuple[str, float]]:
+        """基于倒排索引的BM25F关键词检索，返回 (诗词ID, 分数) 列表"""
+        allowed = None
+        if filters:
+            allowed = self.poem_store.filter_mask(filters)[self._keyword_store_rows]
+        hits = self.keyword_index.search(query, limit, allowed)
+        return [(self.keyword_index.doc_ids[row], score) for row, score in hits]
+    
+    def _vector_hits_batch(self, queries: List[str], top_k: int,
+                           filters: Optional[Dict[str, List[str]]] = None) -> List[List[Tuple[str, float, Document]]]:
+        """批量向量检索，每个查询返回 (诗词ID, 分数, 文档片段) 列表
+        
+        所有查询的向量通过一次调用获取（已缓存的不再计算），堆叠为矩阵后
+        交给FAISS一次检索完成。有过滤条件时由元数据位图在FAISS内部预过滤。
+        """
+        if not self.vector_store or not queries:
+            return [[] for _ in queries]
+        
+        try:
+            # 查询向量优先从缓存获取，未命中的合并为一次嵌入调用
+            matrix = np.asarray(self.query_embeddings.embed_documents(queries), dtype=np.float32)
+            if self.vector_store._normalize_L2:
+                faiss.normalize_L2(matrix)
+            if filters and self.metadata_bitmaps is not None:
+                bitmap = self.metadata_bitmaps.mask(filters)
+                distances, indices = filtered_search(self.vector_store.index, self.index_params, matrix, top_k, bitmap)
+            else:
+                distances, indices = self.vector_store.index.search(matrix, top_k)
+            
+            docstore = self.vector_store.docstore
+            id_map = self.vector_store.index_to_docstore_id
+            batch_hits = []
+            for row_distances, row_indices in zip(distances, indices):
+                hits = []
+                for distance, vector_id in zip(row_distances, row_indices):
+                    # 结果不足 top_k 时以-1补齐
+                    if vector_id == -1:
+                        continue
+                    doc = docstore.search(id_map[int(vector_id)])
+                    if not isinstance(doc, Document):
+                        continue
+                    # 旧版本索引没有位图，只能在结果中筛选
+                    if filters and self.metadata_bitmaps is None and not matches_metadata(doc.metadata, filters):
+                        continue
+                    # FAISS返回L2距离，转换为越大越相似的分数
+                    hits.append((doc.metadata.get("id", "unknown"), 1.0 / (1.0 + float(distance)), doc))
+                batch_hits.append(hits)
+            return batch_hits
+        except Exception as e:
+            print(f"向量搜索失败: {e}")
+            return [[] for _ in queries]
+    
+    @staticmethod
+    def _aggregate_hits(hits: List[Tuple[str, float, Document]], method: str) -> List[Tuple[str, float, Document]]:
+        """将片段命中按诗词ID聚合，按聚合分数降序排列，代表片段取分数最高的一个
+        
+        Args:
+            hits: 按分数降序排列的片段命中
+            method: max（取最高片段分数）或 sum（累加各片段分数）
+        """
         poems = {}
+        for poem_id, score, doc in hits:
+            entry = poems.get(poem_id)
+            if entry is None:
+                poems[poem_id] = [score, doc]
+            elif method == "sum":
+                entry[0] += score
+        return sorted(((poem_id, score, doc) for poem_id, (score, doc) in poems.items()), key=lambda hit: -hit[1])
+    
+    def _poem_hits_batch(self, queries: List[str], top_k: int,
+                         filters: Optional[Dict[str, List[str]]] = None) -> List[List[Tuple[str, float, Document]]]:
+        """按诗词聚合的批量向量检索，每个查询最多返回 top_k 首不同的诗词
         
-        # 加载示例数据
-        sample_file = os.path.join(settings.RAW_DATA_PATH, "sample_poems.json")
-        if os.path.exists(sample_file):
-            with open(sample_file, 'r', encoding='utf-8') as f:
-                sample_poems = json.load(f)
-                for poem in sample_poems:
-                    poems[poem["id"]] = poem
+        长诗的正文、注释、背景会分成多个片段，直接取前k个片段时同一首诗可能占据
+        多个位置。这里先多取回 top_k * VECTOR_OVERFETCH 个片段按诗词聚合，
+        凑不满 top_k 首且可能还有更多片段的查询加倍取回数重查（查询向量已缓存），
+        直到凑满或达到 VECTOR_MAX_FETCH。CHUNK_AGGREGATION 为 none 时直接返回片段。
+        """
+        method = settings.CHUNK_AGGREGATION
+        if method == "none":
+            return self._vector_hits_batch(queries, top_k, filters)
         
-        return poems
+        max_fetch = max(settings.VECTOR_MAX_FETCH, top_k)
+        fetch_k = min(top_k * settings.VECTOR_OVERFETCH, max_fetch)
+        batch_hits = [[] for _ in queries]
+        pending = list(range(len(queries)))
+        while pending:
+            next_pending = []
+            for i, hits in zip(pending, self._vector_hits_batch([queries[i] for i in pending], fetch_k, filters)):
+                batch_hits[i] = self._aggregate_hits(hits, method)[:top_k]
+                # 取回的片段数不足 fetch_k 说明已没有更多片段
+                if len(batch_hits[i]) < top_k and len(hits) >= fetch_k and fetch_k < max_fetch:
+                    next_pending.append(i)
+            pending = next_pending
+            fetch_k = min(fetch_k * 2, max_fetch)
+        return batch_hits
+    
+    def _poem_hits(self, query: str, top_k: int,
+                   filters: Optional[Dict[str, List[str]]] = None) -> List[Tuple[str, float, Document]]:
+        """按诗词聚合的向量检索，返回 (诗词ID, 分数, 代表片段) 列表"""
+        return self._poem_hits_batch([query], top_k, filters)[0]
+    
+    @staticmethod
+    def _poem_from_document(doc: Document) -> Poem:
+        """由向量片段构建诗词，仅在诗词存储中找不到该诗词时使用"""
+        return Poem(
+            id=doc.metadata.get("id", "unknown"),
+            title=doc.metadata.get("title", "未知"),
+            author=doc.metadata.get("author", "未知"),
+            dynasty=doc.metadata.get("dynasty", "未知"),
+            content=doc.page_content
+        )
     
-    def search(self, query: str, top_k: int = 5) -> List[SearchResult]:
-        """搜索相关诗词"""
+    def _vector_results(self, hits: List[Tuple[str, float, Document]]) -> List[SearchResult]:
+        """由向量检索命中构建结果，优先返回诗词存储中的完整诗词"""
+        return [
+            SearchResult(
+                poem=self.poem_store.get_poem(poem_id) or self._poem_from_document(doc),
+                similarity_score=score,
+                source="向量检索"
+            )
+            for poem_id, score, doc in hits
+        ]
+    
+    def _vector_search(self, query: str, top_k: int,
+                       filters: Optional[Dict[str, List[str]]] = None) -> List[SearchResult]:
+        """向量检索"""
+        return self._vector_results(self._poem_hits(query, top_k, filters))
+    
+    def _lexical_search(self, query: str, top_k: int,
+                        filters: Optional[Dict[str, List[str]]] = None) -> List[SearchResult]:
+        """关键词检索"""
+        return [
+            SearchResult(
+                poem=self.poem_store.get_poem(poem_id),
+                similarity_score=score,
+                source="关键词匹配"
+            )
+            for poem_id, score in self._keyword_search(query, top_k, filters)
+        ]
+    
+    def _fuse_results(self, vector_hits: List[Tuple[str, float, Document]],
+                      keyword_hits: List[Tuple[str, float]], top_k: int) -> List[SearchResult]:
+        """融合向量检索与关键词检索结果，只为最终保留的诗词构建 Poem 对象"""
+        # 同一首诗可能对应多个向量片段，只保留排名最高的一条
+        vector_best = {}
+        for poem_id, score, doc in vector_hits:
+            vector_best.setdefault(poem_id, (score, doc))
+        ranked_lists = [
+            ("向量检索", [(poem_id, score) for poem_id, (score, _) in vector_best.items()]),
+            ("关键词匹配", keyword_hits)
+        ]
+        
+        sources = {}
+        for source, hits in ranked_lists:
+            for poem_id, _ in hits:
+                sources.setdefault(poem_id, []).append(source)
+        
+        if settings.HYBRID_FUSION_METHOD == "score":
+            fused = normalized_score_fusion([hits for _, hits in ranked_lists])
+        else:
+            fused = reciprocal_rank_fusion(
+                [[poem_id for poem_id, _ in hits] for _, hits in ranked_lists],
+                k=settings.RRF_K
+            )
+        
         results = []
+        for poem_id, score in fused[:top_k]:
+            # 诗词存储中的完整诗词优先于向量片段
+            poem = self.poem_store.get_poem(poem_id) or self._poem_from_document(vector_best[poem_id][1])
+            results.append(SearchResult(poem=poem, similarity_score=score, source="+".join(sources[poem_id])))
+        return results
+    
+    def search(self, query: str, top_k: int = 5, mode: Optional[str] = None,
+               filters: Optional[Dict[str, List[str]]] = None) -> List[SearchResult]:
+        """搜索相关诗词
         
-        # 如果有向量数据库，执行向量搜索
-        if self.vector_store:
-            try:
-                docs = self.vector_store.similarity_search_with_score(query, k=top_k)
-                for doc, score in docs:
-                    # 这里需要根据实际文档结构提取诗词信息
-                    poem_data = {
-                        "id": doc.metadata.get("id", "unknown"),
-                        "title": doc.metadata.get("title", "未知"),
-                        "author": doc.metadata.get("author", "未知"),
-                        "dynasty": doc.metadata.get("dynasty", "未知"),
-                        "content": doc.page_content
-                    }
-                    poem = Poem(**poem_data)
-                    results.append(SearchResult(
-                        poem=poem,
-                        similarity_score=float(score),
-                        source="向量检索"
-                    ))
-            except Exception as e:
-                print(f"向量搜索失败: {e}")
+        Args:
+            query: 查询文本
+            top_k: 返回结果数量
+            mode: 检索模式，vector（向量）、keyword（关键词）或 hybrid（混合），默认取配置
+            filters: 元数据过滤条件 {字段: 取值列表}，字段为 dynasty / author / theme / emotions
+        """
+        mode = mode or settings.SEARCH_MODE
         
-        # 如果没有足够的结果，从本地数据中搜索
-        if len(results) < top_k:
-            # 简单的文本匹配
-            query_lower = query.lower()
-            matched_poems = []
-            
-            for poem_id, poem_data in self.poems_data.items():
-                # 检查标题、作者、内容是否匹配查询
-                if (query_lower in poem_data["title"].lower() or 
-                    query_lower in poem_data["author"].lower() or 
-                    query_lower in poem_data["content"].lower() or
-                    any(keyword in poem_data["content"].lower() for keyword in query_lower.split())):
-                    
-                    matched_poems.append(poem_data)
-            
-            # 添加匹配的诗词到结果中
-            for i, poem_data in enumerate(matched_poems[:top_k - len(results)]):
-                poem = Poem(**poem_data)
-                results.append(SearchResult(
-                    poem=poem,
-                    similarity_score=1.0 - (i * 0.1),  # 简单的相似度计算
-                    source="关键词匹配"
-                ))
-        
-        # 按相似度排序
-        results.sort(key=lambda x: x.similarity_score, reverse=True)
+        # 启用重排序时多取回候选，交由重排序器截断
+        retrieve_k = max(top_k, self.reranker.candidates) if self.reranker else top_k
         
+        if mode == "vector":
+            results = self._vector_search(query, retrieve_k, filters)
+        elif mode == "keyword":
+            results = self._lexical_search(query, retrieve_k, filters)
+        else:
+            # 混合检索：向量检索与关键词检索并行执行后融合
+            candidate_k = retrieve_k * settings.HYBRID_OVERFETCH
+            vector_future = self._retrieval_executor.submit(self._poem_hits, query, candidate_k, filters)
+            keyword_hits = self._keyword_search(query, candidate_k, filters)
+            vector_hits = vector_future.result()
+            results = self._fuse_results(vector_hits, keyword_hits, retrieve_k)
+        
+        if self.reranker:
+            return self.reranker.rerank(query, results, top_k)
         return results[:top_k]
     
-    async def async_search(self, query: str, top_k: int = 5) -> List[SearchResult]:
+    def search_batch(self, queries: List[str], top_k: int = 5, mode: Optional[str] = None,
+                     filters: Optional[Dict[str, List[str]]] = None) -> List[List[SearchResult]]:
+        """批量搜索相关诗词，结果与逐条调用 search 一致
+        
+        向量检索对全部查询只做一次嵌入调用和一次FAISS检索；关键词检索、
+        融合和重排序仍按查询逐条进行。
+        """
+        mode = mode or settings.SEARCH_MODE
+        retrieve_k = max(top_k, self.reranker.candidates) if self.reranker else top_k
+        
+        if mode == "vector":
+            batch_results = [self._vector_results(hits) for hits in self._poem_hits_batch(queries, retrieve_k, filters)]
+        elif mode == "keyword":
+            batch_results = [self._lexical_search(query, retrieve_k, filters) for query in queries]
+        else:
+            # 批量向量检索与各查询的关键词检索并行执行
+            candidate_k = retrieve_k * settings.HYBRID_OVERFETCH
+            vector_future = self._retrieval_executor.submit(self._poem_hits_batch, queries, candidate_k, filters)
+            keyword_hits = [self._keyword_search(query, candidate_k, filters) for query in queries]
+            batch_results = [
+                self._fuse_results(vector_hits, hits, retrieve_k)
+                for vector_hits, hits in zip(vector_future.result(), keyword_hits)
+            ]
+        
+        if self.reranker:
+            return [self.reranker.rerank(query, results, top_k) for query, results in zip(queries, batch_results)]
+        return [results[:top_k] for results in batch_results]
+    
+    async def async_search(self, query: str, top_k: int = 5, mode: Optional[str] = None,
+                           filters: Optional[Dict[str, List[str]]] = None) -> List[SearchResult]:
         """异步搜索相关诗词"""
         # 使用异步服务包装同步搜索方法
-        return await async_service.run_in_threadpool(self.search, query, top_k)
+        return await async_service.run_in_threadpool(self.search, query, top_k, mode, filters)
+    
+    async def async_search_batch(self, queries: List[str], top_k: int = 5, mode: Optional[str] = None,
+                                 filters: Optional[Dict[str, List[str]]] = None) -> List[List[SearchResult]]:
+        """异步批量搜索相关诗词"""
+        return await async_service.run_in_threadpool(self.search_batch, queries, top_k, mode, filters)
+    
+    def _build_context(self, search_results: List[SearchResult]) -> str:
+        """在token预算内构建上下文"""
+        context, _ = self.context_builder.build(search_results)
+        return context
+    
+    def _create_answer_chain(self):
+        """创建答案生成链，输入为包含 context 和 question 的字典"""
+        prompt = ChatPromptTemplate.from_template(ANSWER_PROMPT_TEMPLATE)
+        return prompt | self.llm | StrOutputParser()
+    
+    def _cached_answer(self, query: str, search_results: List[SearchResult]) -> Tuple[Optional[str], Optional[List[float]]]:
+        """查找缓存答案，同时返回用于相似匹配的查询向量"""
+        query_vector = None
+        if self.answer_cache.similarity_threshold <= 1:
+            try:
+                # 检索阶段通常已经缓存了该查询的向量
+                query_vector = self.query_embeddings.embed_query(query)
+            except Exception as e:
+                print(f"获取查询向量失败: {e}")
+        poem_ids = [result.poem.id for result in search_results]
+        return self.answer_cache.get(query, poem_ids, query_vector), query_vector
+    
+    def _store_answer(self, query: str, search_results: List[SearchResult], answer: str,
+                      query_vector: Optional[List[float]]):
+        """缓存生成的答案"""
+        poem_ids = [result.poem.id for result in search_results]
+        self.answer_cache.set(query, poem_ids, answer, query_vector)
     
     def generate_answer(self, query: str, search_results: List[SearchResult]) -> str:
         """基于检索结果生成答案"""
         if not search_results:
             return "未找到相关诗词。"
         
-        # 构建上下文
-        context = "\n".join([
-            f"诗词: {result.poem.title}\n作者: {result.poem.author}\n朝代: {result.poem.dynasty}\n内容: {result.poem.content}\n译文: {result.poem.translation or '无'}"
-            for result in search_results
-        ])
+        cached, query_vector = self._cached_answer(query, search_results)
+        if cached is not None:
+            return cached
         
-        # 创建提示模板
-        template = """你是一个古诗词专家，请根据以下诗词信息回答用户的问题。
-
-相关诗词信息:
-{context}
-
-用户问题: {question}
-
-请用简洁明了的语言回答，适合初中生理解。"""
+        try:
+            answer = self.answer_chain.invoke({"context": self._build_context(search_results), "question": query})
+        except Exception as e:
+            print(f"生成答案失败: {e}")
+            return "生成答案时出现错误。"
+        self._store_answer(query, search_results, answer, query_vector)
+        return answer
+    
+    async def astream_answer(self, query: str, search_results: List[SearchResult]) -> AsyncIterator[str]:
+        """流式生成答案，逐段产出模型输出的文本"""
+        if not search_results:
+            yield "未找到相关诗词。"
+            return
         
-        prompt = ChatPromptTemplate.from_template(template)
+        cached, query_vector = await async_service.run_in_threadpool(self._cached_answer, query, search_results)
+        if cached is not None:
+            yield cached
+            return
         
-        # 创建处理链
-        chain = (
-            {"context": RunnablePassthrough(), "question": RunnablePassthrough()}
-            | prompt
-            | self.llm
-            | StrOutputParser()
-        )
+        chunks = []
+        try:
+            async with self._llm_semaphore:
+                async for chunk in self.answer_chain.astream(
+                    {"context": self._build_context(search_results), "question": query}
+                ):
+                    if chunk:
+                        chunks.append(chunk)
+                        yield chunk
+        except Exception as e:
+            print(f"流式生成答案失败: {e}")
+            yield "生成答案时出现错误。"
+            return
+        await async_service.run_in_threadpool(self._store_answer, query, search_results, "".join(chunks), query_vector)
+    
+    async def async_generate_answer(self, query: str, search_results: List[SearchResult]) -> str:
+        """异步生成答案
+        
+        直接在事件循环上调用 ainvoke，等待模型响应期间不占用线程池。
+        """
+        if not search_results:
+            return "未找到相关诗词。"
+        
+        cached, query_vector = await async_service.run_in_threadpool(self._cached_answer, query, search_results)
+        if cached is not None:
+            return cached
         
         try:
-            answer = chain.invoke({"context": context, "question": query})
-            return answer
+            async with self._llm_semaphore:
+                answer = await self.answer_chain.ainvoke(
+                    {"context": self._build_context(search_results), "question": query}
+                )
         except Exception as e:
             print(f"生成答案失败: {e}")
             return "生成答案时出现错误。"
+        await async_service.run_in_threadpool(self._store_answer, query, search_results, answer, query_vector)
+        return answer
     
-    async def async_generate_answer(self, query: str, search_results: List[SearchResult]) -> str:
-        """异步生成答案"""
-        # 使用异步服务包装同步生成方法
-        return await async_service.run_in_threadpool(self.generate_answer, query, search_results)
+    async def async_generate_answers(self, queries: List[str],
+                                     batch_results: List[List[SearchResult]]) -> List[str]:
+        """批量生成答案，并发数受 LLM_MAX_CONCURRENCY 限制"""
+        return await asyncio.gather(*[
+            self.async_generate_answer(query, results)
+            for query, results in zip(queries, batch_results)
+        ])
     
     def get_poem_by_id(self, poem_id: str) -> Poem:
         """根据ID获取诗词"""
-        poem_data = self.poems_data.get(poem_id)
-        if poem_data:
-            return Poem(**poem_data)
-        return None
+        return self.poem_store.get_poem(poem_id)
     
     async def async_get_poem_by_id(self, poem_id: str) -> Poem:
         """异步根据ID获取诗词"""
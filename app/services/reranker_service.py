@@ -0,0 +1,196 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Optional
+from app.core.config import settings
+from app.core.lru_cache import LRUCache
+from app.models.schemas import SearchResult
+from app.utils.text_index import extract_ngrams
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class LexicalScorer:
+    """纯词法打分器：按查询n-gram在文段中的覆盖率打分，二元组权重高于一元组"""
+    
+    name = "lexical"
+    
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        """批量计算 (查询, 文段) 相关性分数"""
+        query_grams = set(extract_ngrams(query))
+        if not query_grams:
+            return [0.0] * len(passages)
+        
+        weights = {gram: float(len(gram)) for gram in query_grams}
+        total = sum(weights.values())
+        scores = []
+        for passage in passages:
+            passage_grams = set(extract_ngrams(passage))
+            matched = sum(w for gram, w in weights.items() if gram in passage_grams)
+            scores.append(matched / total)
+        return scores
+
+class CrossEncoderScorer:
+    """本地交叉编码器打分器，基于sentence-transformers的CrossEncoder在CPU上批量推理"""
+    
+    def __init__(self, model_name: str, batch_size: int = 32, max_length: int = 512):
+        """加载交叉编码器模型"""
+        from sentence_transformers import CrossEncoder
+        
+        self.name = model_name
+        self.batch_size = batch_size
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+    
+    def score(self, query: str, passages: List[str]) -> List[float]:
+        """批量计算 (查询, 文段) 相关性分数"""
+        if not passages:
+            return []
+        pairs = [(query, passage) for passage in passages]
+        scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+class RerankerService:
+    """重排序服务
+    
+    对检索结果中排在前面的候选按 (查询, 诗词) 对重新打分，其余结果保持原顺序接在后面。
+    未命中缓存的候选在一次批量调用中完成打分，结果写入有界LRU缓存；打分超出时间预算
+    时，本次请求改用词法打分，已开始的模型打分在后台算完后仍会写入缓存供后续请求使用。
+    模型打分最多同时积压 max_pending 个批次，积压已满时直接使用词法打分，不再排队。
+    """
+    
+    def __init__(self, scorer, candidates: int = 20, timeout_ms: int = 300, cache_size: int = 10000,
+                 max_pending: int = 2):
+        """初始化重排序服务
+        
+        Args:
+            scorer: 打分器，需提供 name 属性和批量 score(query, passages) 方法
+            candidates: 参与重排序的最大候选数
+            timeout_ms: 单次重排序的时间预算（毫秒）
+            cache_size: 分数缓存的最大条目数
+            max_pending: 正在执行和排队等待的模型打分批次上限
+        """
+        self.scorer = scorer
+        self.candidates = candidates
+        self.timeout = timeout_ms / 1000.0
+        self.cache = LRUCache(cache_size)
+        self.lexical_scorer = scorer if isinstance(scorer, LexicalScorer) else LexicalScorer()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = threading.BoundedSemaphore(max(1, max_pending))
+    
+    @staticmethod
+    def _passage(result: SearchResult) -> str:
+        """构建用于打分的文段"""
+        poem = result.poem
+        return f"{poem.title} {poem.author} {poem.content}"
+    
+    def _cache_key(self, scorer_name: str, query: str, result: SearchResult):
+        """生成分数缓存键"""
+        return (scorer_name, query.strip().lower(), result.poem.id, hash(result.poem.content))
+    
+    def _store_scores(self, scorer_name: str, query: str, results: List[SearchResult], scores: List[float]):
+        """将分数写入缓存"""
+        for result, score in zip(results, scores):
+            self.cache.set(self._cache_key(scorer_name, query, result), score)
+    
+    def rerank(self, query: str, results: List[SearchResult], top_k: Optional[int] = None) -> List[SearchResult]:
+        """对检索结果重排序
+        
+        只对前 candidates 个结果重新打分，其余结果按原顺序接在后面，最后截取前 top_k 个；
+        top_k 为None时返回全部结果。
+        """
+        if top_k is None:
+            top_k = len(results)
+        if not results or top_k <= 0:
+            return []
+        candidates, tail = results[:self.candidates], results[self.candidates:]
+        return (self._rerank_candidates(query, candidates) + tail)[:top_k]
+    
+    def _rerank_candidates(self, query: str, candidates: List[SearchResult]) -> List[SearchResult]:
+        """对候选结果重新打分并排序"""
+        start_time = time.perf_counter()
+        
+        scores = [self.cache.get(self._cache_key(self.scorer.name, query, r)) for r in candidates]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        
+        if missing:
+            # 模型打分积压已满时不再排队，避免请求相互拖累直至全部超时
+            if not self._pending.acquire(blocking=False):
+                logger.warning("重排序模型繁忙，改用词法打分")
+                return self._lexical_rerank(query, candidates)
+            
+            pending = [candidates[i] for i in missing]
+            passages = [self._passage(r) for r in pending]
+            try:
+                future = self._executor.submit(self.scorer.score, query, passages)
+            except Exception:
+                self._pending.release()
+                raise
+            
+            # 超时后已开始的打分仍会算完，届时再把分数写入缓存
+            def store_when_done(f):
+                self._pending.release()
+                if not f.cancelled() and f.exception() is None:
+                    self._store_scores(self.scorer.name, query, pending, f.result())
+            future.add_done_callback(store_when_done)
+            
+            try:
+                model_scores = future.result(timeout=self.timeout)
+                for i, score in zip(missing, model_scores):
+                    scores[i] = score
+            except FutureTimeoutError:
+                # 仍在排队的打分不再执行
+                future.cancel()
+                logger.warning(f"重排序超出时间预算({self.timeout * 1000:.0f}ms)，改用词法打分")
+                return self._lexical_rerank(query, candidates)
+            except Exception as e:
+                logger.warning(f"重排序打分失败，改用词法打分: {e}")
+                return self._lexical_rerank(query, candidates)
+        
+        reranked = self._apply_scores(candidates, scores)
+        logger.info(f"重排序完成: 候选{len(candidates)}个, 新打分{len(missing)}个, "
+                    f"耗时{(time.perf_counter() - start_time) * 1000:.1f}ms")
+        return reranked
+    
+    def _lexical_rerank(self, query: str, candidates: List[SearchResult]) -> List[SearchResult]:
+        """使用词法打分器重排序"""
+        name = self.lexical_scorer.name
+        scores = [self.cache.get(self._cache_key(name, query, r)) for r in candidates]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            pending = [candidates[i] for i in missing]
+            lexical_scores = self.lexical_scorer.score(query, [self._passage(r) for r in pending])
+            self._store_scores(name, query, pending, lexical_scores)
+            for i, score in zip(missing, lexical_scores):
+                scores[i] = score
+        return self._apply_scores(candidates, scores)
+    
+    @staticmethod
+    def _apply_scores(candidates: List[SearchResult], scores: List[float]) -> List[SearchResult]:
+        """按重排序分数排序，原检索顺序作为同分时的次序"""
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return [
+            candidates[i].model_copy(update={"similarity_score": float(scores[i])})
+            for i in order
+        ]
+
+def create_reranker() -> Optional[RerankerService]:
+    """根据配置创建重排序服务，模型不可用时退回词法打分"""
+    if settings.RERANKER == "none":
+        return None
+    
+    scorer = None
+    if settings.RERANKER == "cross_encoder":
+        try:
+            scorer = CrossEncoderScorer(settings.RERANKER_MODEL, batch_size=settings.RERANK_BATCH_SIZE)
+            logger.info(f"重排序模型加载成功: {settings.RERANKER_MODEL}")
+        except Exception as e:
+            logger.warning(f"重排序模型加载失败，使用词法重排序: {e}")
+    
+    return RerankerService(
+        scorer or LexicalScorer(),
+        candidates=settings.RERANK_CANDIDATES,
+        timeout_ms=settings.RERANK_TIMEOUT_MS,
+        cache_size=settings.RERANK_CACHE_SIZE
+    )
\ No newline at end of file
@@ -0,0 +1,255 @@
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import faiss
+from app.core.config import settings
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 索引参数文件名，与FAISS索引保存在同一目录
+INDEX_PARAMS_FILE = "index_params.json"
+
+# 支持的索引类型
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+
+# FAISS建议每个聚类中心至少有39个训练样本
+MIN_POINTS_PER_CENTROID = 39
+
+# HNSW过滤检索退回精确检索时，每次重建并打分的向量数
+EXACT_SEARCH_CHUNK = 4096
+
+def default_index_params(index_type: Optional[str] = None) -> Dict[str, Any]:
+    """从配置生成索引构建参数"""
+    index_type = index_type or settings.FAISS_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支持的索引类型: {index_type}")
+    
+    params: Dict[str, Any] = {"index_type": index_type}
+    if index_type == "hnsw":
+        params.update({
+            "M": settings.FAISS_HNSW_M,
+            "efConstruction": settings.FAISS_EF_CONSTRUCTION,
+            "efSearch": settings.FAISS_EF_SEARCH
+        })
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        params.update({
+            "nlist": settings.FAISS_NLIST,
+            "nprobe": settings.FAISS_NPROBE,
+            "train_sample": settings.FAISS_TRAIN_SAMPLE
+        })
+        if index_type == "ivf_pq":
+            params.update({"pq_m": settings.FAISS_PQ_M, "pq_nbits": settings.FAISS_PQ_NBITS})
+    return params
+
+def _train_sample(vectors: np.ndarray, sample_size: int) -> np.ndarray:
+    """随机抽取训练样本"""
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(0)
+    return vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+def supports_remove(params: Dict[str, Any]) -> bool:
+    """索引是否支持按ID删除向量（HNSW不支持，删除时需要重建）"""
+    return params.get("index_type", "flat") != "hnsw"
+
+class FaissIndexBuilder:
+    """分批构建带ID映射的FAISS索引
+    
+    向量可以分多次加入，构建时不需要把全部向量放进内存。IVF类索引先缓冲向量，
+    达到训练样本数（或全部加入完毕）时在缓冲的向量上训练聚类中心，之后的向量
+    直接加入；语料较小时自动缩小 nlist。其余类型在首批向量到达时创建索引。
+    实际使用的参数会回写到 params 中，便于与索引一起保存。
+    IVF索引原生支持自定义ID，其余类型包装为 IndexIDMap2。
+    """
+    
+    def __init__(self, params: Dict[str, Any]):
+        """初始化构建器"""
+        self.params = params
+        self.index: Optional[faiss.Index] = None
+        self._buffer: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._buffered = 0
+    
+    @property
+    def _needs_training(self) -> bool:
+        return self.params["index_type"] in ("ivf_flat", "ivf_pq")
+    
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        """加入一批向量及其ID"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        
+        if self.index is None:
+            if self._needs_training:
+                self._buffer.append((vectors, ids))
+                self._buffered += len(vectors)
+                if self._buffered >= self.params["train_sample"]:
+                    self._train()
+                return
+            self.index = self._create(vectors.shape[1])
+        self.index.add_with_ids(vectors, ids)
+    
+    def finish(self) -> faiss.Index:
+        """完成构建并返回索引，设置好检索期参数"""
+        if self.index is None:
+            if self._buffered:
+                self._train()
+            elif "dim" in self.params and not self._needs_training:
+                # 没有任何向量时创建同维度的空索引
+                self.index = self._create(self.params["dim"])
+            else:
+                raise ValueError("没有可加入索引的向量")
+        apply_search_params(self.index, self.params)
+        return self.index
+    
+    def _create(self, dim: int) -> faiss.Index:
+        """创建精确检索或HNSW索引"""
+        self.params["dim"] = dim
+        if self.params["index_type"] == "flat":
+            return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+        hnsw_index = faiss.IndexHNSWFlat(dim, self.params["M"])
+        hnsw_index.hnsw.efConstruction = self.params["efConstruction"]
+        return faiss.IndexIDMap2(hnsw_index)
+    
+    def _train(self):
+        """在缓冲的向量上训练IVF索引，然后加入这些向量"""
+        params = self.params
+        vectors = np.vstack([v for v, _ in self._buffer])
+        ids = np.concatenate([i for _, i in self._buffer])
+        self._buffer = []
+        dim = vectors.shape[1]
+        params["dim"] = dim
+        
+        # nlist 和 pq_nbits 按实际参与训练的样本数确定
+        sample = _train_sample(vectors, params["train_sample"])
+        n = len(sample)
+        nlist = max(1, min(params["nlist"], n // MIN_POINTS_PER_CENTROID))
+        if nlist != params["nlist"]:
+            logger.warning(f"训练样本数量({n})不足，nlist 由 {params['nlist']} 调整为 {nlist}")
+            params["nlist"] = nlist
+        params["nprobe"] = min(params["nprobe"], nlist)
+        
+        quantizer = faiss.IndexFlatL2(dim)
+        if params["index_type"] == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            # 子空间数必须整除向量维度
+            pq_m = params["pq_m"]
+            while dim % pq_m:
+                pq_m -= 1
+            params["pq_m"] = pq_m
+            # 每个PQ码本需要 2^nbits 个训练样本
+            params["pq_nbits"] = max(1, min(params["pq_nbits"], int(np.log2(max(n, 2)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, params["pq_nbits"])
+        
+        logger.info(f"训练{params['index_type']}索引: 样本{len(sample)}条, nlist={nlist}")
+        index.train(sample)
+        index.add_with_ids(vectors, ids)
+        self.index = index
+
+def apply_search_params(index: faiss.Index, params: Dict[str, Any]):
+    """设置检索期参数（IVF的nprobe、HNSW的efSearch）"""
+    index_type = params.get("index_type", "flat")
+    if index_type in ("ivf_flat", "ivf_pq") and "nprobe" in params:
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    elif index_type == "hnsw" and "efSearch" in params:
+        hnsw_index = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+        hnsw_index.hnsw.efSearch = params["efSearch"]
+
+def search_parameters(index: faiss.Index, params: Dict[str, Any], selector: faiss.IDSelector,
+                      exhaustive: bool = False) -> faiss.SearchParameters:
+    """构建带ID选择器的检索参数
+    
+    IVF和HNSW索引要求对应类型的参数对象，其中的 nprobe / efSearch 取索引当前值；
+    exhaustive 为真时IVF探查全部聚类，保证选中的向量都会被扫描到。
+    """
+    index_type = params.get("index_type", "flat")
+    if index_type in ("ivf_flat", "ivf_pq"):
+        ivf_index = faiss.extract_index_ivf(index)
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf_index.nlist if exhaustive else ivf_index.nprobe)
+    if index_type == "hnsw":
+        hnsw_index = faiss.downcast_index(index.index) if hasattr(index, "id_map") else index
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw_index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def filtered_search(index: faiss.Index, params: Dict[str, Any], queries: np.ndarray, k: int,
+                    bitmap: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """以ID位图预过滤的检索
+    
+    过滤在索引内部进行，不满足条件的向量不参与排序，开销与不过滤时相当。
+    近似索引在过滤条件很严格时可能找不齐结果：IVF改为探查全部聚类重查，
+    HNSW对选中的向量分块做精确检索，保证每个查询都能返回 min(k, 选中数) 条结果。
+    
+    Args:
+        index: FAISS索引
+        params: 索引参数
+        queries: 查询向量矩阵
+        k: 每个查询返回的结果数
+        bitmap: 向量ID位图，位序与 faiss.IDSelectorBitmap 一致
+    
+    Returns:
+        (距离矩阵, 向量ID矩阵)，不足k条时以-1补齐
+    """
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    bitmap = np.ascontiguousarray(bitmap, dtype=np.uint8)
+    selector = faiss.IDSelectorBitmap(bitmap)
+    distances, labels = index.search(queries, k, params=search_parameters(index, params, selector))
+    
+    matched = np.flatnonzero(np.unpackbits(bitmap, bitorder="little"))
+    expected = min(k, len(matched))
+    short = np.flatnonzero((labels >= 0).sum(axis=1) < expected)
+    if not len(short):
+        return distances, labels
+    
+    logger.info(f"过滤检索结果不足，{len(short)}个查询改用完整检索")
+    if params.get("index_type", "flat") in ("ivf_flat", "ivf_pq"):
+        short_distances, short_labels = index.search(
+            queries[short], k, params=search_parameters(index, params, selector, exhaustive=True)
+        )
+    else:
+        exact_distances, exact_labels = _exact_search(index, queries[short], matched, expected)
+        short_distances = np.full((len(short), k), np.inf, dtype=np.float32)
+        short_labels = np.full((len(short), k), -1, dtype=np.int64)
+        short_distances[:, :expected] = exact_distances
+        short_labels[:, :expected] = exact_labels
+    distances[short] = short_distances
+    labels[short] = short_labels
+    return distances, labels
+
+def _exact_search(index: faiss.Index, queries: np.ndarray, ids: np.ndarray,
+                  k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """在指定ID的向量中做精确检索
+    
+    向量按 EXACT_SEARCH_CHUNK 分块重建并打分，逐块与当前的前k个结果合并，
+    内存占用与选中的向量数无关。
+    """
+    best_distances = np.empty((len(queries), 0), dtype=np.float32)
+    best_labels = np.empty((len(queries), 0), dtype=np.int64)
+    for start in range(0, len(ids), EXACT_SEARCH_CHUNK):
+        chunk = ids[start:start + EXACT_SEARCH_CHUNK]
+        distances, positions = faiss.knn(queries, index.reconstruct_batch(chunk), min(k, len(chunk)))
+        distances = np.hstack([best_distances, distances])
+        labels = np.hstack([best_labels, chunk[positions]])
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        best_distances = np.take_along_axis(distances, order, axis=1)
+        best_labels = np.take_along_axis(labels, order, axis=1)
+    return best_distances, best_labels
+
+def save_index_params(path: str, params: Dict[str, Any]):
+    """保存索引参数"""
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, INDEX_PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+
+def load_index_params(path: str) -> Dict[str, Any]:
+    """读取索引参数，旧版本索引没有参数文件时视为精确检索索引"""
+    params_file = os.path.join(path, INDEX_PARAMS_FILE)
+    if not os.path.exists(params_file):
+        return {"index_type": "flat"}
+    with open(params_file, "r", encoding="utf-8") as f:
+        return json.load(f)
\ No newline at end of file
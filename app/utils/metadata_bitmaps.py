@@ -0,0 +1,138 @@
+import os
+import json
+from array import array
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+# 可用于过滤的元数据字段
+FILTER_FIELDS = ("dynasty", "author", "theme", "emotions")
+
+# 元数据中以逗号拼接的多值字段
+MULTI_VALUE_FIELDS = ("emotions",)
+
+# 存储文件名，与FAISS索引保存在同一版本目录
+BITMAPS_FILE = "metadata_bitmaps.npy"
+POSTINGS_FILE = "metadata_postings.npy"
+VOCAB_FILE = "metadata_bitmaps.json"
+
+# 成员数超过ID空间的1/64时，位图比ID列表更省空间
+DENSE_RATIO = 64
+
+def metadata_values(field: str, metadata: Dict[str, Any]) -> List[str]:
+    """取出文档片段元数据中某字段的取值"""
+    value = metadata.get(field)
+    if not value:
+        return []
+    if field in MULTI_VALUE_FIELDS:
+        return [item for item in str(value).split(",") if item]
+    return [str(value)]
+
+def matches_metadata(metadata: Dict[str, Any], filters: Dict[str, List[str]]) -> bool:
+    """片段元数据是否满足过滤条件，用于没有位图的旧版本索引"""
+    return all(
+        set(metadata_values(field, metadata)) & set(values)
+        for field, values in filters.items()
+    )
+
+def bitmap_size(id_space: int) -> int:
+    """ID空间对应的位图字节数"""
+    return (id_space + 7) // 8
+
+def set_bits(bitmap: np.ndarray, ids: np.ndarray):
+    """在位图中置位，位序与 faiss.IDSelectorBitmap 一致（第i位为 bitmap[i >> 3] 的第 i & 7 位）"""
+    ids = np.asarray(ids, dtype=np.int64)
+    np.bitwise_or.at(bitmap, ids >> 3, np.left_shift(1, ids & 7).astype(np.uint8))
+
+class MetadataBitmapBuilder:
+    """构建元数据位图索引，随文档片段存储一起写入"""
+    
+    def __init__(self):
+        """初始化"""
+        self._postings: Dict[str, Dict[str, array]] = {field: {} for field in FILTER_FIELDS}
+    
+    def add(self, vector_id: int, metadata: Dict[str, Any]):
+        """登记一个文档片段的元数据"""
+        for field in FILTER_FIELDS:
+            for value in metadata_values(field, metadata):
+                self._postings[field].setdefault(value, array("q")).append(vector_id)
+    
+    def save(self, path: str, id_space: int):
+        """保存位图索引
+        
+        高频取值（如朝代）存为定长位图，低频取值（如大多数作者）存为有序ID列表，
+        总存储不超过为每个片段每个字段记一个ID。
+        """
+        size = bitmap_size(id_space)
+        fields: Dict[str, Dict[str, Dict[str, int]]] = {}
+        dense_rows: List[np.ndarray] = []
+        sparse_ids: List[np.ndarray] = []
+        offset = 0
+        for field, values in self._postings.items():
+            entries = fields[field] = {}
+            for value, ids in values.items():
+                ids = np.unique(np.frombuffer(ids, dtype=np.int64))
+                if len(ids) * DENSE_RATIO > id_space:
+                    row = np.zeros(size, dtype=np.uint8)
+                    set_bits(row, ids)
+                    entries[value] = {"bitmap": len(dense_rows)}
+                    dense_rows.append(row)
+                else:
+                    entries[value] = {"start": offset, "end": offset + len(ids)}
+                    sparse_ids.append(ids)
+                    offset += len(ids)
+        
+        os.makedirs(path, exist_ok=True)
+        bitmaps = np.vstack(dense_rows) if dense_rows else np.zeros((0, size), dtype=np.uint8)
+        postings = np.concatenate(sparse_ids) if sparse_ids else np.empty(0, dtype=np.int64)
+        np.save(os.path.join(path, BITMAPS_FILE), bitmaps)
+        np.save(os.path.join(path, POSTINGS_FILE), postings)
+        with open(os.path.join(path, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"id_space": id_space, "fields": fields}, f, ensure_ascii=False)
+
+class MetadataBitmaps:
+    """元数据位图索引
+    
+    查询时把过滤条件合成为一个覆盖整个向量ID空间的位图：同一字段的多个取值取并集，
+    不同字段之间取交集。该位图可直接作为 faiss.IDSelectorBitmap 在检索时预过滤。
+    """
+    
+    def __init__(self, id_space: int, fields: Dict[str, Dict[str, Dict[str, int]]],
+                 bitmaps: np.ndarray, postings: np.ndarray):
+        """初始化"""
+        self.id_space = id_space
+        self.fields = fields
+        self.bitmaps = bitmaps
+        self.postings = postings
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["MetadataBitmaps"]:
+        """以内存映射方式加载，旧版本索引没有位图时返回None"""
+        vocab_file = os.path.join(path, VOCAB_FILE)
+        if not os.path.exists(vocab_file):
+            return None
+        with open(vocab_file, "r", encoding="utf-8") as f:
+            vocab = json.load(f)
+        return cls(
+            vocab["id_space"],
+            vocab["fields"],
+            np.load(os.path.join(path, BITMAPS_FILE), mmap_mode="r"),
+            np.load(os.path.join(path, POSTINGS_FILE), mmap_mode="r")
+        )
+    
+    def mask(self, filters: Dict[str, List[str]]) -> np.ndarray:
+        """合成过滤位图"""
+        size = bitmap_size(self.id_space)
+        result = None
+        for field, values in filters.items():
+            entries = self.fields.get(field, {})
+            field_mask = np.zeros(size, dtype=np.uint8)
+            for value in values:
+                entry = entries.get(value)
+                if entry is None:
+                    continue
+                if "bitmap" in entry:
+                    np.bitwise_or(field_mask, self.bitmaps[entry["bitmap"]], out=field_mask)
+                else:
+                    set_bits(field_mask, self.postings[entry["start"]:entry["end"]])
+            result = field_mask if result is None else np.bitwise_and(result, field_mask, out=result)
+        return result if result is not None else np.full(size, 0xFF, dtype=np.uint8)
\ No newline at end of file
@@ -0,0 +1,174 @@
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional
+import numpy as np
+from app.models.schemas import Poem
+from app.utils.poem_stream import stream_poems_from_directory
+
+# 取值重复度高的字段，以整数编码存放，字符串只保存一份
+CATEGORICAL_FIELDS = ("author", "dynasty", "theme", "style")
+
+# 长文本字段，以UTF-8拼接存放在连续的字节块中
+TEXT_FIELDS = ("title", "content", "translation", "annotation", "background")
+
+# Poem 中的必填字段，缺失时存为空字符串
+REQUIRED_FIELDS = ("id", "title", "author", "dynasty", "content")
+
+class PoemStore:
+    """列式诗词存储
+    
+    每个字段单独成列：类别字段（作者、朝代、主题、风格）经字符串驻留后存为
+    uint32编码，编码0表示空值；文本字段拼接为一个字节块，按 offsets[i]:offsets[i+1]
+    取出第i行；情感标签是变长列表，同样以编码数组加偏移量存放。
+    诗词ID到行号的映射为字典，查找为O(1)。Poem 对象只在需要返回时才按行构建。
+    """
+    
+    def __init__(self):
+        """初始化空存储"""
+        self.ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._vocab: Dict[str, List[Optional[str]]] = {field: [None] for field in CATEGORICAL_FIELDS + ("emotions",)}
+        self._vocab_codes: Dict[str, Dict[str, int]] = {field: {} for field in self._vocab}
+        
+        self.codes: Dict[str, np.ndarray] = {}
+        self.text_offsets: Dict[str, np.ndarray] = {}
+        self.text_blobs: Dict[str, bytes] = {}
+        self.emotion_offsets = np.zeros(1, dtype=np.uint32)
+        self.emotion_codes = np.empty(0, dtype=np.uint32)
+        
+        # 构建期间的列缓冲区，定稿后转为numpy数组并释放
+        self._building = True
+        self._buf_codes = {field: array("I") for field in CATEGORICAL_FIELDS}
+        self._buf_text = {field: bytearray() for field in TEXT_FIELDS}
+        self._buf_text_offsets = {field: array("Q", [0]) for field in TEXT_FIELDS}
+        self._buf_emotion_codes = array("I")
+        self._buf_emotion_offsets = array("I", [0])
+    
+    def __len__(self) -> int:
+        return len(self._rows)
+    
+    def __contains__(self, poem_id: str) -> bool:
+        return poem_id in self._rows
+    
+    @classmethod
+    def build(cls, poems: Iterable[dict]) -> "PoemStore":
+        """从诗词数据构建存储"""
+        store = cls()
+        for poem in poems:
+            store.add(poem)
+        store.finalize()
+        return store
+    
+    def _intern(self, field: str, value: Optional[str]) -> int:
+        """获取字符串的编码，首次出现时加入词表"""
+        if value is None or value == "":
+            return 0
+        codes = self._vocab_codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._vocab[field])
+            codes[value] = code
+            self._vocab[field].append(value)
+        return code
+    
+    def add(self, poem: dict) -> int:
+        """添加一首诗词，返回其行号；ID重复时以后加入的为准"""
+        if not self._building:
+            raise RuntimeError("诗词存储已定稿，不能再添加诗词")
+        
+        row = len(self.ids)
+        self.ids.append(poem["id"])
+        self._rows[poem["id"]] = row
+        
+        for field in CATEGORICAL_FIELDS:
+            self._buf_codes[field].append(self._intern(field, poem.get(field)))
+        for field in TEXT_FIELDS:
+            encoded = (poem.get(field) or "").encode("utf-8")
+            self._buf_text[field] += encoded
+            self._buf_text_offsets[field].append(len(self._buf_text[field]))
+        for emotion in poem.get("emotions") or []:
+            self._buf_emotion_codes.append(self._intern("emotions", emotion))
+        self._buf_emotion_offsets.append(len(self._buf_emotion_codes))
+        return row
+    
+    def finalize(self):
+        """将构建缓冲区转为紧凑的numpy数组"""
+        if not self._building:
+            return
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field] = np.frombuffer(self._buf_codes[field], dtype=np.uint32).copy()
+        for field in TEXT_FIELDS:
+            self.text_blobs[field] = bytes(self._buf_text[field])
+            self.text_offsets[field] = np.frombuffer(self._buf_text_offsets[field], dtype=np.uint64).copy()
+        self.emotion_codes = np.frombuffer(self._buf_emotion_codes, dtype=np.uint32).copy()
+        self.emotion_offsets = np.frombuffer(self._buf_emotion_offsets, dtype=np.uint32).copy()
+        
+        self._building = False
+        self._buf_codes = self._buf_text = self._buf_text_offsets = None
+        self._buf_emotion_codes = self._buf_emotion_offsets = None
+    
+    def row_of(self, poem_id: str) -> Optional[int]:
+        """获取诗词所在行号"""
+        return self._rows.get(poem_id)
+    
+    def live_rows(self) -> Iterator[int]:
+        """按加入顺序遍历有效行（重复ID只保留最后一行）"""
+        for row, poem_id in enumerate(self.ids):
+            if self._rows[poem_id] == row:
+                yield row
+    
+    def filter_mask(self, filters: Dict[str, List[str]]) -> np.ndarray:
+        """按字段取值筛选行，返回布尔数组；同一字段的多个取值为或，字段之间为与"""
+        self.finalize()
+        mask = np.ones(len(self.ids), dtype=bool)
+        for field, values in filters.items():
+            codes = [self._vocab_codes[field][value] for value in values if value in self._vocab_codes[field]]
+            if field == "emotions":
+                # 逐行判断是否含有任一情感标签：命中数的前缀和在行区间两端之差大于0
+                hit_counts = np.concatenate(([0], np.cumsum(np.isin(self.emotion_codes, codes))))
+                mask &= hit_counts[self.emotion_offsets[1:]] > hit_counts[self.emotion_offsets[:-1]]
+            else:
+                mask &= np.isin(self.codes[field], codes)
+        return mask
+    
+    def _text(self, field: str, row: int) -> str:
+        offsets = self.text_offsets[field]
+        return self.text_blobs[field][int(offsets[row]):int(offsets[row + 1])].decode("utf-8")
+    
+    def record(self, row: int) -> dict:
+        """读取一行为字典，空值字段为None"""
+        self.finalize()
+        record = {"id": self.ids[row]}
+        for field in CATEGORICAL_FIELDS:
+            record[field] = self._vocab[field][self.codes[field][row]]
+        for field in TEXT_FIELDS:
+            record[field] = self._text(field, row) or None
+        start, end = self.emotion_offsets[row], self.emotion_offsets[row + 1]
+        record["emotions"] = [self._vocab["emotions"][code] for code in self.emotion_codes[start:end]] or None
+        for field in REQUIRED_FIELDS:
+            if record[field] is None:
+                record[field] = ""
+        return record
+    
+    def poem_at(self, row: int) -> Poem:
+        """按行构建 Poem 对象"""
+        return Poem(**self.record(row))
+    
+    def get_poem(self, poem_id: str) -> Optional[Poem]:
+        """根据ID构建 Poem 对象"""
+        row = self._rows.get(poem_id)
+        if row is None:
+            return None
+        return self.poem_at(row)
+    
+    def records(self) -> Iterator[dict]:
+        """按加入顺序遍历全部有效诗词"""
+        for row in self.live_rows():
+            yield self.record(row)
+
+def load_poem_store(directory: str) -> PoemStore:
+    """流式读取原始数据目录中的全部诗词文件构建存储
+    
+    服务加载诗词数据和离线构建关键词索引都经由此函数，两者的数据来源和
+    行顺序（含重复ID的处理）完全一致，预构建的索引才能直接使用。
+    """
+    return PoemStore.build(stream_poems_from_directory(directory))
@@ -0,0 +1,175 @@
+import os
+import json
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, TextIO
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 支持的诗词数据文件扩展名
+POEM_FILE_EXTENSIONS = (".json", ".jsonl")
+
+# 每次从文件读取的字符数
+READ_CHUNK_SIZE = 1 << 16
+
+# 可以紧跟在完整JSON值之后的字符
+VALUE_DELIMITERS = ',]}[{"'
+
+# 文件读取结束标记
+_END = object()
+
+class _ReadFailure:
+    """读取线程中发生的异常，经队列交给消费者重新抛出"""
+    
+    def __init__(self, error: BaseException):
+        self.error = error
+
+_decoder = json.JSONDecoder()
+
+def _skip_separators(buffer: str, pos: int, separators: str) -> int:
+    """跳过空白和分隔符"""
+    while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] in separators):
+        pos += 1
+    return pos
+
+def iter_json_values(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """增量解析JSON数组或连续排列的JSON对象，逐个产出元素
+    
+    每次只读入一小段文本，用 raw_decode 解析出完整的元素后即丢弃已解析部分，
+    内存占用与单个元素大小相关，而与文件大小无关。
+    """
+    buffer = ""
+    pos = 0
+    eof = False
+    in_array = None
+    
+    while True:
+        pos = _skip_separators(buffer, pos, "," if in_array else "")
+        if in_array is None and pos < len(buffer):
+            # 顶层为数组时逐个解析数组元素，否则按连续的JSON值解析
+            in_array = buffer[pos] == "["
+            if in_array:
+                pos += 1
+                continue
+        if in_array and pos < len(buffer) and buffer[pos] == "]":
+            return
+        
+        if pos < len(buffer):
+            try:
+                value, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 元素不完整，继续读入
+                if eof:
+                    raise
+            else:
+                # 数字等标量可能恰好在读入边界处被截断，需确认其后紧跟分隔符
+                if eof or (end < len(buffer) and (buffer[end].isspace() or buffer[end] in VALUE_DELIMITERS)):
+                    yield value
+                    pos = end
+                    continue
+        elif eof:
+            if in_array:
+                raise json.JSONDecodeError("JSON数组未闭合", buffer, pos)
+            return
+        
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+def iter_json_lines(f: TextIO) -> Iterator[Dict]:
+    """逐行解析JSON Lines，跳过空行"""
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def iter_poems_from_file(file_path: str) -> Iterator[Dict]:
+    """从单个JSON或JSON Lines文件中逐首读取诗词"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        if file_path.endswith(".jsonl"):
+            yield from iter_json_lines(f)
+        else:
+            yield from iter_json_values(f)
+
+def poem_files(directory: str) -> List[str]:
+    """列出目录中的诗词数据文件，按文件名排序以保证读取顺序稳定"""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.endswith(POEM_FILE_EXTENSIONS)
+    ]
+
+def stream_poems(file_paths: Iterable[str], workers: int = 4, queue_size: int = 1024) -> Iterator[Dict]:
+    """并行读取多个文件，按文件顺序逐首产出诗词
+    
+    每个文件由一个读取线程解析到各自的有界队列中，消费者按文件顺序依次取出，
+    因此输出顺序与串行读取一致，同时最多只有 workers 个文件在读，
+    每个文件最多缓冲 queue_size 首诗词。某个文件读取或解析失败时，消费者在取到
+    该文件已解析的诗词之后抛出该异常，不会把残缺的数据当作完整结果。
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        return
+    
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in file_paths]
+    
+    def put(q: queue.Queue, item) -> bool:
+        # 消费者提前结束时不再阻塞读取线程
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def read_file(file_path: str, q: queue.Queue):
+        try:
+            for poem in iter_poems_from_file(file_path):
+                if not put(q, poem):
+                    return
+        except Exception as e:
+            logger.error(f"读取诗词文件失败 {file_path}: {e}")
+            put(q, _ReadFailure(e))
+            return
+        put(q, _END)
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="poem-reader")
+    try:
+        # 线程池按提交顺序执行，当前消费的文件总是最早开始读取的，不会相互等待
+        for file_path, q in zip(file_paths, queues):
+            executor.submit(read_file, file_path, q)
+        for q in queues:
+            while True:
+                item = q.get()
+                if item is _END:
+                    break
+                if isinstance(item, _ReadFailure):
+                    raise item.error
+                yield item
+    finally:
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def stream_poems_from_directory(directory: str, workers: int = 4) -> Iterator[Dict]:
+    """流式读取目录中的所有诗词"""
+    return stream_poems(poem_files(directory), workers=workers)
+
+def batched(items: Iterable, batch_size: int) -> Iterator[List]:
+    """将可迭代对象按固定大小分批"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
\ No newline at end of file
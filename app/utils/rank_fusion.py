@@ -0,0 +1,56 @@
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+def reciprocal_rank_fusion(ranked_lists: Sequence[Sequence[Hashable]], k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """倒数排名融合（RRF）
+    
+    每个列表中排名为r（从1开始）的条目得分 weight / (k + r)，各列表得分相加。
+    只依赖名次，不要求不同检索器的分数处于同一量纲。
+    
+    Args:
+        ranked_lists: 多个按相关性降序排列的条目列表
+        k: 平滑常数，越大则头部名次的优势越小
+        weights: 各列表的权重，默认均为1
+    
+    Returns:
+        按融合得分降序排列的 (条目, 得分) 列表
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+    
+    scores: Dict[Hashable, float] = {}
+    for items, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(items, start=1):
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+    
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+def normalized_score_fusion(scored_lists: Sequence[Sequence[Tuple[Hashable, float]]],
+                            weights: Optional[Sequence[float]] = None) -> List[Tuple[Hashable, float]]:
+    """归一化分数融合
+    
+    每个列表内部的分数先做min-max归一化到[0, 1]，再按权重相加。
+    分数需为越大越相关；列表中只有一个分数时归一化为1。
+    
+    Args:
+        scored_lists: 多个 (条目, 分数) 列表
+        weights: 各列表的权重，默认均为1
+    
+    Returns:
+        按融合得分降序排列的 (条目, 得分) 列表
+    """
+    if weights is None:
+        weights = [1.0] * len(scored_lists)
+    
+    scores: Dict[Hashable, float] = {}
+    for items, weight in zip(scored_lists, weights):
+        if not items:
+            continue
+        values = [score for _, score in items]
+        low, high = min(values), max(values)
+        span = high - low
+        for item, score in items:
+            normalized = (score - low) / span if span > 0 else 1.0
+            scores[item] = scores.get(item, 0.0) + weight * normalized
+    
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
\ No newline at end of file
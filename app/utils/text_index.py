@@ -0,0 +1,228 @@
+import os
+import json
+import math
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# 参与索引的字段
+INDEX_FIELDS = ("title", "author", "content")
+
+# BM25F字段权重：标题、作者命中比正文命中更有区分度
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "content": 1.0}
+
+# BM25F字段长度归一化参数
+FIELD_B = {"title": 0.5, "author": 0.0, "content": 0.75}
+
+# BM25饱和参数
+BM25_K1 = 1.2
+
+# 索引文件格式版本
+INDEX_FORMAT_VERSION = 2
+
+def extract_ngrams(text: str) -> List[str]:
+    """提取文本中的字符一元组和二元组
+    
+    以字母数字字符（含汉字）的连续片段为单位切分，标点和空白只作为分隔符，
+    不会产生跨越标点的二元组。
+    """
+    grams = []
+    run = []
+    for ch in text.lower():
+        if ch.isalnum():
+            run.append(ch)
+            continue
+        if run:
+            _append_run_ngrams(run, grams)
+            run = []
+    if run:
+        _append_run_ngrams(run, grams)
+    return grams
+
+def _append_run_ngrams(run: List[str], grams: List[str]):
+    """将一个连续片段的一元组和二元组追加到结果中"""
+    grams.extend(run)
+    for i in range(len(run) - 1):
+        grams.append(run[i] + run[i + 1])
+
+class CharNgramIndex:
+    """诗词字符n-gram倒排索引
+    
+    对标题、作者、内容建立汉字一元组和二元组的倒排表。倒排表以CSR形式
+    存放在连续的numpy数组中：offsets[t]:offsets[t+1] 即为第t个n-gram的
+    行号区间。
+    
+    检索采用BM25F打分：定稿时按字段长度和字段权重预先计算每个倒排项的
+    饱和词频（impact），与IDF表一起存为紧凑数组，查询时只需累加
+    idf * impact 并选出前k个。
+    """
+    
+    def __init__(self):
+        """初始化空索引"""
+        self.doc_ids: List[str] = []
+        self._term_ids: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.postings_data = np.empty(0, dtype=np.uint32)
+        self.impacts = np.empty(0, dtype=np.float32)
+        self.idf = np.empty(0, dtype=np.float32)
+        self.field_lengths = np.empty((len(INDEX_FIELDS), 0), dtype=np.uint32)
+        
+        # 构建期间的倒排项缓冲区（n-gram编号、行号、分字段词频），定稿后释放
+        self._building = True
+        self._buf_terms = array("I")
+        self._buf_rows = array("I")
+        self._buf_tfs = array("H")
+        self._buf_lengths = array("I")
+    
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+    
+    @classmethod
+    def build(cls, poems: Iterable[dict]) -> "CharNgramIndex":
+        """从诗词数据构建索引"""
+        index = cls()
+        for poem in poems:
+            index.add(poem)
+        index.finalize()
+        return index
+    
+    def add(self, poem: dict) -> int:
+        """添加一首诗词，返回其行号"""
+        if not self._building:
+            raise RuntimeError("索引已定稿，不能再添加诗词")
+        
+        row = len(self.doc_ids)
+        self.doc_ids.append(poem["id"])
+        
+        counts = {}
+        for slot, field in enumerate(INDEX_FIELDS):
+            grams = extract_ngrams(poem.get(field) or "")
+            self._buf_lengths.append(len(grams))
+            for gram, tf in Counter(grams).items():
+                counts.setdefault(gram, [0] * len(INDEX_FIELDS))[slot] = min(tf, 0xFFFF)
+        
+        for gram, tfs in counts.items():
+            term_id = self._term_ids.get(gram)
+            if term_id is None:
+                term_id = self._term_ids[gram] = len(self._term_ids)
+            self._buf_terms.append(term_id)
+            self._buf_rows.append(row)
+            self._buf_tfs.extend(tfs)
+        return row
+    
+    def finalize(self):
+        """整理CSR倒排表，计算IDF表和BM25F倒排项权重"""
+        if not self._building:
+            return
+        
+        n_docs = len(self.doc_ids)
+        n_terms = len(self._term_ids)
+        n_fields = len(INDEX_FIELDS)
+        
+        terms = np.frombuffer(self._buf_terms, dtype=np.uint32)
+        rows = np.frombuffer(self._buf_rows, dtype=np.uint32)
+        tfs = np.frombuffer(self._buf_tfs, dtype=np.uint16).reshape(-1, n_fields).astype(np.float32)
+        lengths = np.frombuffer(self._buf_lengths, dtype=np.uint32).reshape(-1, n_fields)
+        
+        # 稳定排序保证同一n-gram内行号仍然升序
+        order = np.argsort(terms, kind="stable")
+        df = np.bincount(terms, minlength=n_terms)
+        
+        # 分字段长度归一化后加权求和，再做BM25饱和
+        avg_lengths = lengths.mean(axis=0) if n_docs else np.zeros(n_fields)
+        combined = np.zeros(len(rows), dtype=np.float32)
+        for slot, field in enumerate(INDEX_FIELDS):
+            b = FIELD_B[field]
+            norm = 1.0 - b + b * lengths[:, slot] / (avg_lengths[slot] or 1.0)
+            combined += FIELD_WEIGHTS[field] * tfs[:, slot] / norm[rows].astype(np.float32)
+        
+        self.offsets = np.concatenate(([0], np.cumsum(df))).astype(np.int64)
+        self.postings_data = rows[order].copy()
+        self.impacts = (combined / (BM25_K1 + combined))[order]
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.field_lengths = lengths.T.copy()
+        
+        self._building = False
+        self._buf_terms = self._buf_rows = self._buf_tfs = self._buf_lengths = None
+    
+    def search(self, query: str, top_k: int = 5, allowed: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """BM25F检索，返回按得分降序排列的 (行号, 得分) 列表
+        
+        allowed 为按行号的布尔数组时，只在其为真的行中选出前k个。
+        """
+        self.finalize()
+        
+        term_ids = {self._term_ids[gram] for gram in extract_ngrams(query) if gram in self._term_ids}
+        if not term_ids or top_k <= 0:
+            return []
+        
+        # 高频n-gram（如常见虚词）不做截断，由IDF自然降低其权重
+        offsets = self.offsets
+        rows = np.concatenate([self.postings_data[offsets[t]:offsets[t + 1]] for t in term_ids])
+        weights = np.concatenate([
+            self.impacts[offsets[t]:offsets[t + 1]] * self.idf[t] for t in term_ids
+        ])
+        scores = np.bincount(rows, weights=weights)
+        if allowed is not None:
+            scores *= allowed[:len(scores)]
+        
+        # 只在有得分的行中选出前k个
+        hits = np.flatnonzero(scores)
+        k = min(top_k, len(hits))
+        if k == 0:
+            return []
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(row), float(scores[row])) for row in top]
+    
+    def save(self, path: str):
+        """保存索引到目录
+        
+        目录中包含 index.json（文档ID与词表）以及倒排表、权重、IDF表和
+        字段长度的 .npy 数组文件。
+        """
+        self.finalize()
+        os.makedirs(path, exist_ok=True)
+        
+        vocab = [None] * len(self._term_ids)
+        for gram, term_id in self._term_ids.items():
+            vocab[term_id] = gram
+        
+        for name in ("offsets", "postings_data", "impacts", "idf", "field_lengths"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "fields": list(INDEX_FIELDS),
+                "doc_ids": self.doc_ids,
+                "vocab": vocab
+            }, f, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, path: str) -> Optional["CharNgramIndex"]:
+        """从目录加载预构建的索引，文件缺失或格式不符时返回None
+        
+        数组文件以内存映射方式打开，加载时间与索引大小基本无关。
+        """
+        header_file = os.path.join(path, "index.json")
+        if not os.path.exists(header_file):
+            return None
+        
+        with open(header_file, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header.get("version") != INDEX_FORMAT_VERSION or header.get("fields") != list(INDEX_FIELDS):
+            return None
+        
+        index = cls()
+        for name in ("offsets", "postings_data", "impacts", "idf", "field_lengths"):
+            array_file = os.path.join(path, f"{name}.npy")
+            if not os.path.exists(array_file):
+                return None
+            setattr(index, name, np.load(array_file, mmap_mode="r"))
+        
+        index.doc_ids = header["doc_ids"]
+        index._term_ids = {gram: term_id for term_id, gram in enumerate(header["vocab"])}
+        index._building = False
+        index._buf_terms = index._buf_rows = index._buf_tfs = index._buf_lengths = None
+        return index
\ No newline at end of file
@@ -0,0 +1,7 @@
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的token数
+    
+    中文基本一字一token，其余字符按每4个一token计，宁可高估以免超出限额。
+    """
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4 + 1
\ No newline at end of file
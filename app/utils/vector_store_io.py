@@ -0,0 +1,241 @@
+import os
+import json
+import mmap
+import time
+import shutil
+import logging
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.base import Docstore
+from langchain_community.vectorstores import FAISS
+from app.utils.faiss_index import apply_search_params, load_index_params, save_index_params
+from app.utils.metadata_bitmaps import MetadataBitmapBuilder
+
+# 配置日志
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 存储文件名
+FAISS_INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.bin"
+OFFSETS_FILE = "chunks.offsets.npy"
+MANIFEST_FILE = "manifest.json"
+
+# 当前生效的索引版本目录由该文件指明，切换版本时原子替换
+CURRENT_FILE = "CURRENT"
+
+# 旧版本直接存放在向量库根目录下的文件
+LEGACY_FILES = ("index.faiss", "index.pkl", CHUNKS_FILE, OFFSETS_FILE, "index_params.json")
+
+# 优先只映射索引数据，旧版本FAISS退回通用的内存映射标志
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+def encode_chunk(doc: Document) -> bytes:
+    """将文档片段编码为UTF-8 JSON记录"""
+    return json.dumps(
+        {"page_content": doc.page_content, "metadata": doc.metadata},
+        ensure_ascii=False
+    ).encode("utf-8")
+
+class MmapDocstore(Docstore):
+    """基于内存映射的只读文档存储
+    
+    文档ID即片段序号的字符串形式。文件页由操作系统按需加载，并在多个进程间共享。
+    """
+    
+    def __init__(self, path: str):
+        """打开文档片段存储"""
+        self._file = open(os.path.join(path, CHUNKS_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+    
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+    
+    def raw_record(self, vector_id: int) -> bytes:
+        """读取片段的原始记录，ID不存在或已删除时返回空字节串"""
+        if not 0 <= vector_id < len(self):
+            return b""
+        return self._data[int(self.offsets[vector_id]):int(self.offsets[vector_id + 1])]
+    
+    def search(self, search: str) -> Union[str, Document]:
+        """根据ID读取文档片段"""
+        try:
+            record = self.raw_record(int(search))
+        except ValueError:
+            record = b""
+        if not record:
+            return f"ID {search} not found."
+        record = json.loads(record.decode("utf-8"))
+        return Document(page_content=record["page_content"], metadata=record["metadata"])
+    
+    def add(self, texts: Dict[str, Document]) -> None:
+        """只读存储不支持添加"""
+        raise NotImplementedError("MmapDocstore 为只读存储，请通过 process_data.py 重建")
+    
+    def delete(self, ids: List) -> None:
+        """只读存储不支持删除"""
+        raise NotImplementedError("MmapDocstore 为只读存储，请通过 process_data.py 重建")
+
+class SequentialIdMap(Mapping):
+    """向量序号到文档ID的恒等映射，避免为每个向量常驻一个字典项"""
+    
+    def __init__(self, size: int):
+        self._size = size
+    
+    def __getitem__(self, key: int) -> str:
+        if not 0 <= key < self._size:
+            raise KeyError(key)
+        return str(key)
+    
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+    
+    def __len__(self) -> int:
+        return self._size
+
+def current_index_dir(path: str) -> str:
+    """获取当前生效的索引目录，没有版本目录时为向量库根目录（旧版本布局）"""
+    current_file = os.path.join(path, CURRENT_FILE)
+    if os.path.exists(current_file):
+        with open(current_file, "r", encoding="utf-8") as f:
+            return os.path.join(path, f.read().strip())
+    return path
+
+def load_manifest(path: str) -> Optional[Dict[str, Any]]:
+    """读取当前索引版本的增量构建清单"""
+    manifest_file = os.path.join(current_index_dir(path), MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return None
+    with open(manifest_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class VectorIndexWriter:
+    """分批写入新版本的向量数据库
+    
+    所有文件写入临时的版本目录：文档片段记录随生成随写入 chunks.bin，同时登记
+    元数据位图；全部写完后由 commit 写入FAISS索引、偏移表、位图、索引参数和清单，
+    重命名版本目录并原子替换 CURRENT 指针，最后删除旧版本。正在运行的进程仍持有
+    旧文件的内存映射，不受影响。
+    
+    chunks.bin 中按向量ID升序依次存放各片段的记录，chunks.offsets.npy 记录
+    各ID的起始偏移（共 id_space+1 项），ID为i的片段即 chunks.bin[offsets[i]:offsets[i+1]]，
+    已删除的ID对应空区间。
+    """
+    
+    def __init__(self, path: str):
+        """在向量库目录下创建临时版本目录"""
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.generation = f"gen-{time.time_ns()}"
+        self.tmp_dir = os.path.join(path, self.generation + ".tmp")
+        os.makedirs(self.tmp_dir)
+        self._chunks = open(os.path.join(self.tmp_dir, CHUNKS_FILE), "wb")
+        self._offsets = array("Q")
+        self._position = 0
+        self._bitmaps = MetadataBitmapBuilder()
+        self._done = False
+    
+    def __enter__(self) -> "VectorIndexWriter":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if not self._done:
+            self.abort()
+    
+    def add_records(self, records: Iterable[Tuple[int, bytes]]):
+        """追加 (向量ID, 记录) 序列，ID须大于已写入的ID"""
+        for vector_id, record in records:
+            if vector_id < len(self._offsets):
+                raise ValueError(f"片段记录须按向量ID升序写入: {vector_id}")
+            # 跳过的ID对应空区间
+            self._offsets.extend([self._position] * (vector_id + 1 - len(self._offsets)))
+            self._chunks.write(record)
+            self._position += len(record)
+            self._bitmaps.add(vector_id, json.loads(record.decode("utf-8"))["metadata"])
+    
+    def commit(self, index: faiss.Index, id_space: int, params: Dict[str, Any], manifest: Dict[str, Any]):
+        """写入其余文件并切换为当前版本
+        
+        Args:
+            index: FAISS索引
+            id_space: ID空间大小（最大ID + 1）
+            params: 索引参数
+            manifest: 增量构建清单
+        """
+        try:
+            self._chunks.close()
+            if id_space < len(self._offsets):
+                raise ValueError(f"ID空间({id_space})小于已写入的片段ID")
+            offsets = np.full(id_space + 1, self._position, dtype=np.uint64)
+            offsets[:len(self._offsets)] = np.frombuffer(self._offsets, dtype=np.uint64)
+            np.save(os.path.join(self.tmp_dir, OFFSETS_FILE), offsets)
+            
+            faiss.write_index(index, os.path.join(self.tmp_dir, FAISS_INDEX_FILE))
+            self._bitmaps.save(self.tmp_dir, id_space)
+            params["storage"] = "mmap"
+            save_index_params(self.tmp_dir, params)
+            with open(os.path.join(self.tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.rename(self.tmp_dir, os.path.join(self.path, self.generation))
+        except Exception:
+            self.abort()
+            raise
+        self._done = True
+        
+        previous_dir = current_index_dir(self.path)
+        current_tmp = os.path.join(self.path, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w", encoding="utf-8") as f:
+            f.write(self.generation)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(current_tmp, os.path.join(self.path, CURRENT_FILE))
+        
+        # 清理旧版本
+        if previous_dir != self.path:
+            shutil.rmtree(previous_dir, ignore_errors=True)
+        else:
+            for filename in LEGACY_FILES:
+                legacy_file = os.path.join(self.path, filename)
+                if os.path.exists(legacy_file):
+                    os.remove(legacy_file)
+    
+    def abort(self):
+        """放弃本次写入，删除临时版本目录"""
+        self._done = True
+        self._chunks.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+def load_vector_store(path: str, embeddings: Embeddings) -> Optional[FAISS]:
+    """加载向量数据库
+    
+    新格式以内存映射方式打开索引和文档存储，加载时间基本与索引大小无关；
+    只有旧版本的pickle格式才走 FAISS.load_local。
+    """
+    path = current_index_dir(path)
+    if not os.path.exists(os.path.join(path, FAISS_INDEX_FILE)):
+        return None
+    
+    params = load_index_params(path)
+    if params.get("storage") == "mmap":
+        index = faiss.read_index(os.path.join(path, FAISS_INDEX_FILE), MMAP_FLAGS)
+        docstore = MmapDocstore(path)
+        vector_store = FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=SequentialIdMap(len(docstore))
+        )
+    else:
+        logger.warning("向量数据库为旧版pickle格式，建议重新运行 process_data.py 以启用内存映射加载")
+        vector_store = FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+    
+    # 恢复构建时记录的检索参数（nprobe / efSearch）
+    apply_search_params(vector_store.index, params)
+    return vector_store
\ No newline at end of file
@@ -4,31 +4,12 @@ Neo4j知识图谱构建脚本
 用于构建基于诗词数据的Neo4j知识图谱
 """
 
-import os
-import json
-from typing import List, Dict
 from app.core.config import settings
 from app.services.neo4j_kg_service import AsyncNeo4jKnowledgeGraphService
+from app.utils.poem_stream import batched, stream_poems_from_directory
 
-async def load_poems_from_json(json_file: str) -> List[Dict]:
-    """从JSON文件加载诗词数据"""
-    if os.path.exists(json_file):
-        with open(json_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-async def load_poems_from_directory(directory: str) -> List[Dict]:
-    """从目录加载所有诗词数据"""
-    all_poems = []
-    
-    # 加载JSON文件
-    for filename in os.listdir(directory):
-        if filename.endswith('.json'):
-            file_path = os.path.join(directory, filename)
-            poems = await load_poems_from_json(file_path)
-            all_poems.extend(poems)
-    
-    return all_poems
+# 每批导入知识图谱的诗词数
+INGEST_BATCH_SIZE = 500
 
 async def build_neo4j_knowledge_graph():
     """构建Neo4j知识图谱"""
@@ -38,12 +19,21 @@ async def build_neo4j_knowledge_graph():
     kg_service = AsyncNeo4jKnowledgeGraphService()
     
     try:
-        # 加载诗词数据
-        print("加载诗词数据...")
-        poems = await load_poems_from_directory(settings.RAW_DATA_PATH)
-        print(f"加载了 {len(poems)} 首诗词")
+        # 初始化图谱后流式分批导入诗词，不把全部数据同时加载到内存
+        print("初始化知识图谱...")
+        success = await kg_service.prepare_knowledge_graph()
         
-        if not poems:
+        total = 0
+        if success:
+            print("流式导入诗词数据...")
+            for batch in batched(stream_poems_from_directory(settings.RAW_DATA_PATH), INGEST_BATCH_SIZE):
+                success = await kg_service.ingest_poems(batch)
+                if not success:
+                    break
+                total += len(batch)
+                print(f"已导入 {total} 首诗词")
+        
+        if success and total == 0:
             print("没有找到诗词数据，使用示例数据")
             # 创建一些示例数据
             sample_poems = [
@@ -81,11 +71,7 @@ async def build_neo4j_knowledge_graph():
                     "background": "诗人登楼远眺有感而发"
                 }
             ]
-            poems = sample_poems
-        
-        # 构建知识图谱
-        print("构建知识图谱...")
-        success = await kg_service.build_knowledge_graph(poems)
+            success = await kg_service.ingest_poems(sample_poems)
         
         if success:
             print("知识图谱构建成功！")
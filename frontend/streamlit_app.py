@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 import os
 from dotenv import load_dotenv
 
@@ -9,6 +10,17 @@ load_dotenv()
 # 应用配置
 API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000/api/v1")
 
+def iter_sse_events(response):
+    """解析SSE响应，逐个产出 (事件名, 数据)"""
+    event = "message"
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            event = "message"
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event, json.loads(line[len("data:"):].strip())
+
 st.set_page_config(
     page_title="古诗词RAG系统",
     page_icon="📜",
@@ -31,53 +43,69 @@ if app_mode == "诗词检索":
     query = st.text_input("请输入您要查询的诗词关键词、诗句或问题：")
     
     # 参数设置
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     with col1:
         top_k = st.slider("返回结果数量", 1, 20, 5)
     with col2:
         use_rag = st.checkbox("启用RAG生成", value=True)
+    with col3:
+        # 选择“默认”时不传 search_mode，由服务端配置 SEARCH_MODE 决定
+        search_mode = st.selectbox(
+            "检索模式",
+            [None, "hybrid", "vector", "keyword"],
+            format_func=lambda mode: {None: "默认", "hybrid": "混合检索", "vector": "向量检索",
+                                      "keyword": "关键词检索"}[mode]
+        )
     
     if st.button("搜索") and query:
         with st.spinner("正在搜索中..."):
             try:
-                # 调用后端API
-                response = requests.post(
-                    f"{API_BASE_URL}/query",
-                    json={
-                        "query": query,
-                        "top_k": top_k,
-                        "use_rag": use_rag
-                    }
-                )
+                payload = {"query": query, "top_k": top_k, "use_rag": use_rag}
+                if search_mode is not None:
+                    payload["search_mode"] = search_mode
+                
+                # 调用后端流式API：先返回检索结果，再逐段返回生成的答案
+                response = requests.post(f"{API_BASE_URL}/query/stream", json=payload, stream=True)
                 
                 if response.status_code == 200:
-                    data = response.json()
-                    
-                    # 显示生成的答案
-                    if data.get("generated_answer"):
-                        st.subheader("🤖 AI回答")
-                        st.write(data["generated_answer"])
-                    
-                    # 显示检索结果
-                    st.subheader("📚 检索结果")
-                    for result in data.get("results", []):
-                        poem = result["poem"]
-                        with st.expander(f"{poem['title']} - {poem['author']}"):
-                            st.write(f"**朝代**: {poem['dynasty']}")
-                            st.write(f"**内容**: \n{poem['content']}")
-                            if poem.get("translation"):
-                                st.write(f"**译文**: \n{poem['translation']}")
-                            if poem.get("annotation"):
-                                st.write(f"**注释**: \n{poem['annotation']}")
-                            st.write(f"**相似度**: {result['similarity_score']:.4f}")
-                            st.write(f"**来源**: {result['source']}")
+                    # 答案显示在检索结果上方，先占位
+                    answer_box = st.container()
+                    results_box = st.container()
+                    answer_text = None
+                    answer = ""
                     
-                    # 显示情感分析
-                    if data.get("sentiment_analysis"):
-                        st.subheader("❤️ 情感分析")
-                        sentiment = data["sentiment_analysis"]
-                        st.write(f"情感倾向: {sentiment.get('sentiment')}")
-                        st.write(f"积极概率: {sentiment.get('positive_prob'):.4f}")
+                    for event, data in iter_sse_events(response):
+                        if event == "results":
+                            # 显示检索结果
+                            results_box.subheader("📚 检索结果")
+                            for result in data:
+                                poem = result["poem"]
+                                with results_box.expander(f"{poem['title']} - {poem['author']}"):
+                                    st.write(f"**朝代**: {poem['dynasty']}")
+                                    st.write(f"**内容**: \n{poem['content']}")
+                                    if poem.get("translation"):
+                                        st.write(f"**译文**: \n{poem['translation']}")
+                                    if poem.get("annotation"):
+                                        st.write(f"**注释**: \n{poem['annotation']}")
+                                    st.write(f"**相似度**: {result['similarity_score']:.4f}")
+                                    st.write(f"**来源**: {result['source']}")
+                        
+                        elif event == "token":
+                            # 显示生成的答案
+                            if answer_text is None:
+                                answer_box.subheader("🤖 AI回答")
+                                answer_text = answer_box.empty()
+                            answer += data["text"]
+                            answer_text.write(answer)
+                        
+                        elif event == "sentiment" and data:
+                            # 显示情感分析
+                            st.subheader("❤️ 情感分析")
+                            st.write(f"情感倾向: {data.get('sentiment')}")
+                            st.write(f"积极概率: {data.get('positive_prob'):.4f}")
+                        
+                        elif event == "error":
+                            st.warning(f"{data.get('stage')} 出错: {data.get('detail')}")
                 
                 else:
                     st.error(f"请求失败: {response.status_code}")
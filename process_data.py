@@ -6,117 +6,303 @@
 
 import os
 import json
-from typing import List, Dict
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+import asyncio
+import hashlib
+import argparse
+from collections import deque
+from typing import Any, Callable, Container, Deque, List, Dict, Iterable, Iterator, Tuple
+import numpy as np
+import faiss
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
 from app.core.config import settings
 from app.utils.pdf_processor import PDFProcessor
+from app.utils.text_index import CharNgramIndex
+from app.utils.poem_stream import batched, stream_poems_from_directory
+from app.utils.poem_store import load_poem_store
+from app.services.embedding_service import create_embeddings, embedding_model_name
+from app.services.embedding_pipeline import EmbeddingPipeline, create_embedding_pipeline
+from app.utils.faiss_index import FaissIndexBuilder, default_index_params, load_index_params, supports_remove
+from app.utils.vector_store_io import (
+    FAISS_INDEX_FILE, MmapDocstore, VectorIndexWriter, current_index_dir, encode_chunk, load_manifest
+)
 
-def load_poems_from_json(json_file: str) -> List[Dict]:
-    """从JSON文件加载诗词数据"""
-    if os.path.exists(json_file):
-        with open(json_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+# 增量构建清单格式版本
+MANIFEST_VERSION = 1
 
-def load_poems_from_directory(directory: str) -> List[Dict]:
-    """从目录加载所有诗词数据"""
-    all_poems = []
+# 没有原始数据时使用的示例诗词
+SAMPLE_POEMS = [
+    {"id": "tang001", "title": "静夜思", "author": "李白", "dynasty": "唐代",
+     "content": "床前明月光，疑是地上霜。举头望明月，低头思故乡。"},
+    {"id": "tang002", "title": "春晓", "author": "孟浩然", "dynasty": "唐代",
+     "content": "春眠不觉晓，处处闻啼鸟。夜来风雨声，花落知多少。"}
+]
+
+def iter_raw_poems() -> Iterator[Dict]:
+    """流式读取原始诗词数据，没有数据时使用示例数据"""
+    empty = True
+    for poem in stream_poems_from_directory(settings.RAW_DATA_PATH):
+        empty = False
+        yield poem
+    if empty:
+        print("没有找到诗词数据，使用示例数据")
+        yield from SAMPLE_POEMS
+
+def create_document_from_poem(poem: Dict) -> Document:
+    """从单首诗词数据创建文档"""
+    # 创建文档内容
+    content = f"诗词标题: {poem['title']}\n作者: {poem['author']}\n朝代: {poem['dynasty']}\n内容: {poem['content']}"
+    if poem.get('translation'):
+        content += f"\n译文: {poem['translation']}"
+    if poem.get('annotation'):
+        content += f"\n注释: {poem['annotation']}"
+    if poem.get('background'):
+        content += f"\n创作背景: {poem['background']}"
     
-    # 加载JSON文件
-    for filename in os.listdir(directory):
-        if filename.endswith('.json'):
-            file_path = os.path.join(directory, filename)
-            poems = load_poems_from_json(file_path)
-            all_poems.extend(poems)
+    # 创建文档
+    return Document(
+        page_content=content,
+        metadata={
+            "id": poem["id"],
+            "title": poem["title"],
+            "author": poem["author"],
+            "dynasty": poem["dynasty"],
+            "theme": poem.get("theme", ""),
+            "emotions": ",".join(poem.get("emotions", []))
+        }
+    )
+
+def create_documents_from_poems(poems: Iterable[Dict]) -> Iterator[Document]:
+    """从诗词数据逐个创建文档"""
+    for poem in poems:
+        yield create_document_from_poem(poem)
+
+def poem_content_hash(poem: Dict) -> str:
+    """计算诗词内容哈希，任一字段变化都会导致哈希变化"""
+    payload = json.dumps(poem, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def build_config() -> Dict[str, Any]:
+    """影响向量结果的构建配置，任一项变化都需要全量重建"""
+    return {
+        "embedding_model": embedding_model_name(),
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "index_params": default_index_params()
+    }
+
+def create_text_splitter() -> RecursiveCharacterTextSplitter:
+    """创建文档分割器"""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP
+    )
+
+def scan_poem_hashes() -> Dict[str, str]:
+    """流式读取全部诗词，只保留诗词ID到内容哈希的映射，同一ID出现多次时以最后一次为准"""
+    return {poem["id"]: poem_content_hash(poem) for poem in iter_raw_poems()}
+
+def diff_poems(old_poems: Dict[str, Dict[str, Any]],
+               hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    """对比清单中的诗词与当前数据，返回 (新增, 修改, 删除) 的诗词ID列表"""
+    added = [poem_id for poem_id in hashes if poem_id not in old_poems]
+    changed = [poem_id for poem_id, poem_hash in hashes.items()
+               if poem_id in old_poems and old_poems[poem_id]["hash"] != poem_hash]
+    removed = [poem_id for poem_id in old_poems if poem_id not in hashes]
+    return added, changed, removed
+
+def iter_poem_splits(hashes: Dict[str, str], poem_ids: Container[str]) -> Iterator[Document]:
+    """再次流式读取诗词，逐首产出 poem_ids 中诗词分割出的文档片段
     
-    return all_poems
+    同一ID出现多次时只处理内容哈希与 hashes 中一致的那一次。
+    """
+    text_splitter = create_text_splitter()
+    done = set()
+    for poem in iter_raw_poems():
+        poem_id = poem["id"]
+        if poem_id not in poem_ids or poem_id in done or poem_content_hash(poem) != hashes.get(poem_id):
+            continue
+        done.add(poem_id)
+        yield from text_splitter.split_documents([create_document_from_poem(poem)])
 
-def create_documents_from_poems(poems: List[Dict]) -> List[Document]:
-    """从诗词数据创建文档"""
-    documents = []
+def add_splits(pipeline: EmbeddingPipeline, splits: Iterable[Document], start_id: int,
+               add_vectors: Callable[[np.ndarray, np.ndarray], None], writer: VectorIndexWriter,
+               vector_ids: Dict[str, List[int]]) -> int:
+    """按固定批大小向量化文档片段，逐批加入索引并写入片段记录
     
-    for poem in poems:
-        # 创建文档内容
-        content = f"诗词标题: {poem['title']}\n作者: {poem['author']}\n朝代: {poem['dynasty']}\n内容: {poem['content']}"
-        if poem.get('translation'):
-            content += f"\n译文: {poem['translation']}"
-        if poem.get('annotation'):
-            content += f"\n注释: {poem['annotation']}"
-        if poem.get('background'):
-            content += f"\n创作背景: {poem['background']}"
-        
-        # 创建文档
-        doc = Document(
-            page_content=content,
-            metadata={
-                "id": poem["id"],
-                "title": poem["title"],
-                "author": poem["author"],
-                "dynasty": poem["dynasty"],
-                "theme": poem.get("theme", ""),
-                "emotions": ",".join(poem.get("emotions", []))
-            }
-        )
-        documents.append(doc)
-    
-    return documents
-
-def build_vector_database():
-    """构建向量数据库"""
+    全部片段经由同一个向量化流，每分钟token预算和吞吐量统计在整个构建中连续；
+    同一时刻只有一批片段及其向量在内存中。向量ID从 start_id 起顺序分配，
+    诗词ID到向量ID列表的映射记入 vector_ids。
+    
+    Args:
+        pipeline: 批量向量化流水线
+        splits: 文档片段序列
+        start_id: 起始向量ID
+        add_vectors: 接收 (向量, 向量ID) 并加入索引的函数
+        writer: 新版本向量数据库的写入器
+        vector_ids: 诗词ID到向量ID列表的映射
+    
+    Returns:
+        下一个可用的向量ID
+    """
+    # 向量化流逐批取走片段，产出的向量与取走的批次一一对应
+    pending: Deque[List[Document]] = deque()
+    
+    def texts() -> Iterator[List[str]]:
+        for batch in batched(splits, settings.VECTOR_BUILD_BATCH_SIZE):
+            pending.append(batch)
+            yield [doc.page_content for doc in batch]
+    
+    async def run() -> int:
+        next_id = start_id
+        async for vectors in pipeline.aembed_stream(texts()):
+            batch = pending.popleft()
+            ids = np.arange(next_id, next_id + len(batch), dtype=np.int64)
+            add_vectors(vectors, ids)
+            writer.add_records((int(i), encode_chunk(doc)) for i, doc in zip(ids, batch))
+            for vector_id, doc in zip(ids, batch):
+                vector_ids.setdefault(doc.metadata["id"], []).append(int(vector_id))
+            next_id += len(batch)
+            print(f"已向量化 {next_id - start_id} 个文档片段")
+        return next_id
+    
+    return asyncio.run(run())
+
+def build_vector_database(full_rebuild: bool = False):
+    """构建向量数据库
+    
+    清单记录每首诗词的内容哈希及其片段对应的向量ID。再次运行时只对新增和
+    内容变化的诗词生成向量，并按ID从索引中删除已删除或已变化诗词的旧向量；
+    嵌入模型、分块或索引配置变化时自动全量重建。
+    
+    原始数据读取两遍：第一遍只计算内容哈希，第二遍逐首分割需要生成向量的诗词，
+    片段按 VECTOR_BUILD_BATCH_SIZE 分批向量化后立即加入索引并写入片段存储，
+    内存占用不随语料规模增长（IVF索引训练前缓冲的向量以训练样本数为上限）。
+    
+    Args:
+        full_rebuild: 忽略已有清单，强制全量重建
+    """
     print("开始构建向量数据库...")
     
-    # 初始化嵌入模型
-    embeddings = OpenAIEmbeddings(
-        openai_api_key=settings.OPENAI_API_KEY,
-        openai_api_base=settings.OPENAI_API_BASE,
-        model=settings.EMBEDDING_MODEL
-    )
+    # 初始化嵌入模型及批量向量化流水线
+    pipeline = create_embedding_pipeline(create_embeddings(), embedding_model_name())
+    
+    config = build_config()
+    manifest = None if full_rebuild else load_manifest(settings.VECTOR_DB_PATH)
+    if manifest and (manifest.get("version") != MANIFEST_VERSION or manifest.get("config") != config):
+        print("嵌入模型或索引配置已变化，执行全量重建")
+        manifest = None
     
-    # 加载诗词数据
     print("加载诗词数据...")
-    poems = load_poems_from_directory(settings.RAW_DATA_PATH)
-    print(f"加载了 {len(poems)} 首诗词")
+    hashes = scan_poem_hashes()
+    print(f"加载了 {len(hashes)} 首诗词")
     
-    if not poems:
-        print("没有找到诗词数据，使用示例数据")
-        # 创建一些示例文档
-        sample_docs = [
-            Document(
-                page_content="静夜思 李白 床前明月光，疑是地上霜。举头望明月，低头思故乡。",
-                metadata={"id": "tang001", "title": "静夜思", "author": "李白", "dynasty": "唐代"}
-            ),
-            Document(
-                page_content="春晓 孟浩然 春眠不觉晓，处处闻啼鸟。夜来风雨声，花落知多少。",
-                metadata={"id": "tang002", "title": "春晓", "author": "孟浩然", "dynasty": "唐代"}
-            )
-        ]
-        documents = sample_docs
+    if manifest is None:
+        _full_build(pipeline, hashes, config)
     else:
-        # 创建文档
-        documents = create_documents_from_poems(poems)
+        _incremental_build(pipeline, hashes, config, manifest)
     
-    # 分割文档
-    print("分割文档...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP
+    # 向量已保存，检查点不再需要
+    pipeline.clear_checkpoint()
+    print("向量数据库构建完成！")
+
+def _full_build(pipeline: EmbeddingPipeline, hashes: Dict[str, str], config: Dict[str, Any]):
+    """全量构建向量数据库"""
+    index_params = dict(config["index_params"], embedding_model=config["embedding_model"])
+    print(f"创建向量数据库（索引类型: {index_params['index_type']}）...")
+    builder = FaissIndexBuilder(index_params)
+    vector_ids: Dict[str, List[int]] = {}
+    
+    with VectorIndexWriter(settings.VECTOR_DB_PATH) as writer:
+        print("生成文档向量...")
+        id_space = add_splits(pipeline, iter_poem_splits(hashes, hashes), 0, builder.add, writer, vector_ids)
+        print(f"分割成 {id_space} 个文档片段")
+        index = builder.finish()
+        
+        # 保存向量数据库：FAISS索引、文档片段存储、索引参数及清单
+        print("保存向量数据库...")
+        manifest = _make_manifest(config, hashes, vector_ids, id_space)
+        writer.commit(index, id_space, index_params, manifest)
+
+def _incremental_build(pipeline: EmbeddingPipeline, hashes: Dict[str, str],
+                       config: Dict[str, Any], manifest: Dict[str, Any]):
+    """基于清单增量更新向量数据库，只对新增和内容变化的诗词生成向量"""
+    old_poems = manifest["poems"]
+    added, changed, removed = diff_poems(old_poems, hashes)
+    print(f"增量更新: 新增 {len(added)} 首, 修改 {len(changed)} 首, 删除 {len(removed)} 首")
+    
+    if not (added or changed or removed):
+        print("诗词数据没有变化，跳过向量数据库构建")
+        return
+    
+    # 旧版本的索引文件以普通方式读入内存，便于修改
+    index_dir = current_index_dir(settings.VECTOR_DB_PATH)
+    index = faiss.read_index(os.path.join(index_dir, FAISS_INDEX_FILE))
+    index_params = load_index_params(index_dir)
+    docstore = MmapDocstore(index_dir)
+    
+    pending = set(added) | set(changed)
+    stale_ids = np.array(
+        [i for poem_id in changed + removed for i in old_poems[poem_id]["ids"]], dtype=np.int64
     )
-    splits = text_splitter.split_documents(documents)
-    print(f"分割成 {len(splits)} 个文档片段")
+    kept_poems = {poem_id: entry["ids"] for poem_id, entry in old_poems.items()
+                  if poem_id in hashes and poem_id not in pending}
+    kept_ids = sorted(i for ids in kept_poems.values() for i in ids)
     
-    # 创建向量数据库
-    print("创建向量数据库...")
-    vector_store = FAISS.from_documents(splits, embeddings)
+    if supports_remove(index_params):
+        if len(stale_ids):
+            index.remove_ids(stale_ids)
+        add_vectors = index.add_with_ids
+        builder = None
+    else:
+        # HNSW不支持删除：用保留向量的原值和新向量重建图，无需重新调用嵌入模型；
+        # 全部诗词都被删除时得到同维度的空索引
+        print("索引不支持删除，使用保留向量重建索引...")
+        builder = FaissIndexBuilder(index_params)
+        for start in range(0, len(kept_ids), settings.VECTOR_BUILD_BATCH_SIZE):
+            ids = np.array(kept_ids[start:start + settings.VECTOR_BUILD_BATCH_SIZE], dtype=np.int64)
+            builder.add(index.reconstruct_batch(ids), ids)
+        add_vectors = builder.add
+    
+    vector_ids = dict(kept_poems)
+    with VectorIndexWriter(settings.VECTOR_DB_PATH) as writer:
+        # 保留的片段记录直接从旧存储复制，新片段接在后面
+        writer.add_records((i, docstore.raw_record(i)) for i in kept_ids)
+        
+        # ID接着已分配的最大ID递增，不复用
+        print(f"为 {len(pending)} 首新增或修改的诗词生成向量...")
+        id_space = add_splits(pipeline, iter_poem_splits(hashes, pending), manifest["next_id"],
+                              add_vectors, writer, vector_ids)
+        if builder is not None:
+            index = builder.finish()
+        
+        print(f"保存向量数据库（共 {index.ntotal} 个向量）...")
+        new_manifest = _make_manifest(config, hashes, vector_ids, id_space)
+        writer.commit(index, id_space, index_params, new_manifest)
+
+def _make_manifest(config: Dict[str, Any], hashes: Dict[str, str],
+                   vector_ids: Dict[str, List[int]], next_id: int) -> Dict[str, Any]:
+    """生成增量构建清单"""
+    return {
+        "version": MANIFEST_VERSION,
+        "config": config,
+        "next_id": next_id,
+        "poems": {
+            poem_id: {"hash": poem_hash, "ids": vector_ids.get(poem_id, [])}
+            for poem_id, poem_hash in hashes.items()
+        }
+    }
+
+def build_keyword_index():
+    """构建关键词倒排索引"""
+    print("开始构建关键词倒排索引...")
     
-    # 保存向量数据库
-    print("保存向量数据库...")
-    os.makedirs(settings.VECTOR_DB_PATH, exist_ok=True)
-    vector_store.save_local(settings.VECTOR_DB_PATH)
+    # 经由与服务相同的诗词存储构建，保证文档ID及其顺序与服务加载时一致
+    store = load_poem_store(settings.RAW_DATA_PATH)
+    index = CharNgramIndex.build(store.records())
+    index.save(settings.KEYWORD_INDEX_PATH)
     
-    print("向量数据库构建完成！")
+    print(f"关键词倒排索引构建完成，共 {len(index)} 首诗词")
 
 def process_pdf_files():
     """处理PDF文件"""
@@ -148,13 +334,20 @@ def process_pdf_files():
 
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description="处理原始数据并构建向量数据库")
+    parser.add_argument("--full-rebuild", action="store_true", help="忽略增量构建清单，全量重建向量数据库")
+    args = parser.parse_args()
+    
     print("开始数据处理...")
     
     # 处理PDF文件
     process_pdf_files()
     
     # 构建向量数据库
-    build_vector_database()
+    build_vector_database(full_rebuild=args.full_rebuild)
+    
+    # 构建关键词倒排索引
+    build_keyword_index()
     
     print("数据处理完成！")
 
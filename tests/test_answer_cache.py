@@ -0,0 +1,56 @@
+import pytest
+from app.services import answer_cache as answer_cache_module
+from app.services.answer_cache import AnswerCache
+
+class _MemoryCacheManager:
+    """进程内替身，避免测试读写真实的Redis"""
+    
+    def __init__(self):
+        self.data = {}
+    
+    def get(self, key):
+        return self.data.get(key)
+    
+    def set(self, key, data, ttl=3600):
+        self.data[key] = data
+        return True
+
+@pytest.fixture
+def shared_cache(monkeypatch):
+    manager = _MemoryCacheManager()
+    monkeypatch.setattr(answer_cache_module, "cache_manager", manager)
+    return manager
+
+def test_exact_hit_uses_normalized_query(shared_cache):
+    cache = AnswerCache("v1")
+    cache.set("静夜思表达了什么？", ["a", "b"], "思乡")
+    assert cache.get("  静夜思表达了什么？ ", ["b", "a"]) == "思乡"
+
+def test_shared_cache_hit_from_another_process(shared_cache):
+    AnswerCache("v1").set("问题", ["a"], "答案")
+    other = AnswerCache("v1")
+    assert other.get("问题", ["a"]) == "答案"
+    assert AnswerCache("v2").get("问题", ["a"]) is None
+
+def test_similar_query_reuses_answer(shared_cache):
+    cache = AnswerCache("v1", similarity_threshold=0.95)
+    cache.set("静夜思表达了什么情感", ["a"], "思乡", query_vector=[1.0, 0.0, 0.0])
+    assert cache.get("静夜思抒发了什么感情", ["a"], query_vector=[0.99, 0.05, 0.0]) == "思乡"
+    assert cache.stats()["similar_hits"] == 1
+
+def test_dissimilar_query_or_other_results_miss(shared_cache):
+    cache = AnswerCache("v1", similarity_threshold=0.95)
+    cache.set("静夜思表达了什么情感", ["a"], "思乡", query_vector=[1.0, 0.0, 0.0])
+    assert cache.get("李白是谁", ["a"], query_vector=[0.0, 1.0, 0.0]) is None
+    assert cache.get("静夜思抒发了什么感情", ["b"], query_vector=[1.0, 0.0, 0.0]) is None
+    assert cache.get("静夜思抒发了什么感情", ["a"]) is None
+
+def test_similarity_tier_can_be_disabled(shared_cache):
+    cache = AnswerCache("v1", similarity_threshold=1.1)
+    cache.set("静夜思表达了什么情感", ["a"], "思乡", query_vector=[1.0, 0.0])
+    assert cache.get("静夜思抒发了什么感情", ["a"], query_vector=[1.0, 0.0]) is None
+
+def test_zero_query_vector_is_ignored(shared_cache):
+    cache = AnswerCache("v1")
+    cache.set("问题", ["a"], "答案", query_vector=[0.0, 0.0])
+    assert cache.get("另一个问题", ["a"], query_vector=[0.0, 0.0]) is None
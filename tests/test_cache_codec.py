@@ -0,0 +1,57 @@
+import json
+import pytest
+from app.core.cache_codec import CacheCodec, FLAG_MODELS, FLAG_ZLIB, FORMAT_VERSION, HEADER_SIZE, MAGIC
+from app.models.schemas import Poem, SearchResult
+
+def _result():
+    poem = Poem(id="1", title="静夜思", author="李白", dynasty="唐", content="床前明月光，疑是地上霜。")
+    return SearchResult(poem=poem, similarity_score=0.9, source="vector")
+
+@pytest.mark.parametrize("name,codec_id", [("json", 1), ("orjson", 2), ("msgpack", 3)])
+def test_header_and_round_trip(name, codec_id):
+    codec = CacheCodec(name, compress_threshold=-1)
+    value = {"诗": ["床前明月光", 1, 2.5, None, True]}
+    data = codec.encode(value)
+    assert data[:HEADER_SIZE] == bytes((MAGIC, FORMAT_VERSION, codec_id, 0))
+    assert CacheCodec.parse_header(data) == (FORMAT_VERSION, codec_id, 0)
+    assert codec.decode(data) == value
+
+def test_auto_uses_msgpack():
+    assert CacheCodec("auto").codec.name == "msgpack"
+
+def test_large_value_is_compressed():
+    codec = CacheCodec("msgpack", compress_threshold=64)
+    value = {"content": "床前明月光" * 100}
+    data = codec.encode(value)
+    assert data[3] & FLAG_ZLIB
+    assert codec.decode(data) == value
+    assert not codec.encode({"content": "短"})[3] & FLAG_ZLIB
+
+def test_decode_reads_other_codecs():
+    data = CacheCodec("orjson").encode({"a": 1})
+    assert CacheCodec("msgpack").decode(data) == {"a": 1}
+
+def test_models_are_restored():
+    codec = CacheCodec("msgpack")
+    data = codec.encode({"results": [_result()]})
+    assert data[3] & FLAG_MODELS
+    restored = codec.decode(data)["results"][0]
+    assert isinstance(restored, SearchResult)
+    assert restored == _result()
+
+def test_legacy_json_without_header():
+    codec = CacheCodec("msgpack")
+    legacy = json.dumps({"answer": "思乡"}, ensure_ascii=False)
+    assert CacheCodec.parse_header(legacy.encode("utf-8")) is None
+    assert codec.decode(legacy.encode("utf-8")) == {"answer": "思乡"}
+    assert codec.decode(legacy) == {"answer": "思乡"}
+
+def test_unsupported_version_raises():
+    data = bytearray(CacheCodec("json").encode({"a": 1}))
+    data[1] = FORMAT_VERSION + 1
+    with pytest.raises(ValueError):
+        CacheCodec("json").decode(bytes(data))
+
+def test_unserializable_value_raises():
+    with pytest.raises(ValueError):
+        CacheCodec("msgpack").encode({"a": object()})
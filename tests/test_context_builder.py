@@ -0,0 +1,43 @@
+from app.models.schemas import Poem, SearchResult
+from app.services.context_builder import ContextBuilder, split_sentences
+from app.utils.tokens import estimate_tokens
+
+def _result(poem_id, content, translation=None):
+    poem = Poem(id=poem_id, title=f"题{poem_id}", author="佚名", dynasty="唐",
+                content=content, translation=translation)
+    return SearchResult(poem=poem, similarity_score=1.0, source="vector")
+
+def test_split_sentences_keeps_punctuation():
+    assert split_sentences("床前明月光，疑是地上霜。举头望明月！") == ["床前明月光，疑是地上霜。", "举头望明月！"]
+
+def test_unlimited_budget_keeps_everything():
+    context, _ = ContextBuilder(0).build([_result("1", "床前明月光。疑是地上霜。", "月光照在床前。")])
+    assert "疑是地上霜。" in context
+    assert "译文: 月光照在床前。" in context
+
+def test_long_first_sentence_is_truncated_not_skipped():
+    long_sentence = "春" * 500 + "。"
+    context, tokens = ContextBuilder(120).build([_result("1", long_sentence + "夏日。")])
+    assert "诗词: 题1" in context
+    assert "内容: 春" in context
+    assert "夏日" not in context
+    assert tokens <= 120
+
+def test_later_sentences_stop_at_budget():
+    content = "".join(f"第{i}句诗。" for i in range(100))
+    context, tokens = ContextBuilder(80).build([_result("1", content)])
+    assert "第0句诗。" in context
+    assert "第99句诗。" not in context
+    assert tokens <= 80
+
+def test_duplicate_sentences_kept_once():
+    results = [_result("1", "床前明月光。"), _result("2", "床前明月光。低头思故乡。")]
+    context, _ = ContextBuilder(0).build(results)
+    assert context.count("床前明月光。") == 1
+    assert "低头思故乡。" in context
+
+def test_truncate_fits_budget():
+    head = ContextBuilder._truncate("明" * 50, 10)
+    assert head and estimate_tokens(head) <= 10
+    assert estimate_tokens("明" * (len(head) + 1)) > 10
+    assert ContextBuilder._truncate("明月", 1) == ""
@@ -0,0 +1,12 @@
+from app.services.embedding_cache import SQLITE_QUERY_CHUNK, PersistentEmbeddingStore
+
+def test_get_many_reads_more_keys_than_one_chunk(tmp_path):
+    store = PersistentEmbeddingStore(str(tmp_path / "cache.sqlite"))
+    count = SQLITE_QUERY_CHUNK * 5 + 7
+    store.set_many({f"k{i}": [float(i), 1.0] for i in range(count)})
+    keys = [f"k{i}" for i in range(count + 100)] + ["k0"]
+    vectors = store.get_many(keys)
+    assert len(vectors) == count
+    assert vectors[f"k{count - 1}"] == [float(count - 1), 1.0]
+    assert store.get_many([]) == {}
+    store.close()
@@ -0,0 +1,75 @@
+import asyncio
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.services import embedding_pipeline
+from app.services.embedding_pipeline import EmbeddingPipeline
+
+class _LengthEmbeddings(Embeddings):
+    """以文本长度为向量的替身，记录每次调用的文本"""
+    
+    def __init__(self):
+        self.calls: List[List[str]] = []
+    
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+    
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+def _collect(pipeline, groups):
+    async def run():
+        return [vectors async for vectors in pipeline.aembed_stream(groups)]
+    return asyncio.run(run())
+
+def test_stream_yields_vectors_per_group_in_order():
+    pipeline = EmbeddingPipeline(_LengthEmbeddings(), batch_size=2)
+    groups = [["a", "bb", "ccc"], ["dddd"], ["ee", "f"]]
+    results = _collect(pipeline, groups)
+    assert [len(vectors) for vectors in results] == [3, 1, 2]
+    assert results[0][:, 0].tolist() == [1.0, 2.0, 3.0]
+    assert results[2][:, 0].tolist() == [2.0, 1.0]
+
+def test_stream_shares_one_rate_limiter(monkeypatch):
+    created = []
+    
+    class _CountingLimiter(embedding_pipeline.TokenRateLimiter):
+        def __init__(self, tokens_per_minute):
+            super().__init__(tokens_per_minute)
+            created.append(self)
+    
+    monkeypatch.setattr(embedding_pipeline, "TokenRateLimiter", _CountingLimiter)
+    pipeline = EmbeddingPipeline(_LengthEmbeddings(), batch_size=1, tokens_per_minute=6000)
+    text = "明月" * 50
+    _collect(pipeline, [[text], [text], [text]])
+    assert len(created) == 1
+    # 三组共用的令牌桶扣除了全部三批的预算（每批约100个token）
+    assert created[0].available < created[0].capacity - 250
+
+def test_stream_reads_groups_lazily():
+    pipeline = EmbeddingPipeline(_LengthEmbeddings())
+    consumed = []
+    
+    def groups():
+        for text in ["a", "b", "c"]:
+            consumed.append(text)
+            yield [text]
+    
+    async def run():
+        stream = pipeline.aembed_stream(groups())
+        first = await stream.__anext__()
+        seen = list(consumed)
+        await stream.aclose()
+        return first, seen
+    
+    first, seen = asyncio.run(run())
+    assert first.shape == (1, 2)
+    assert seen == ["a"]
+
+def test_aembed_matches_input_order():
+    embeddings = _LengthEmbeddings()
+    vectors = asyncio.run(EmbeddingPipeline(embeddings, batch_size=2).aembed(["aaa", "b", "cc"]))
+    assert isinstance(vectors, np.ndarray)
+    assert vectors[:, 0].tolist() == [3.0, 1.0, 2.0]
+    assert len(embeddings.calls) == 2
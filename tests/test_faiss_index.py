@@ -0,0 +1,28 @@
+import numpy as np
+from app.utils.faiss_index import FaissIndexBuilder
+
+def _params(**overrides):
+    params = {"index_type": "ivf_pq", "nlist": 1024, "nprobe": 8, "train_sample": 200,
+              "pq_m": 8, "pq_nbits": 8}
+    params.update(overrides)
+    return params
+
+def _vectors(n, dim=32):
+    return np.random.default_rng(1).standard_normal((n, dim)).astype(np.float32)
+
+def test_ivf_pq_sizes_codebooks_from_train_sample():
+    # 一次加入600条，训练样本只取200条，少于 2^8 个码字
+    params = _params()
+    builder = FaissIndexBuilder(params)
+    builder.add(_vectors(600), np.arange(600))
+    index = builder.finish()
+    assert index.ntotal == 600
+    assert 2 ** params["pq_nbits"] <= 200
+    assert params["nlist"] == 200 // 39
+
+def test_ivf_flat_nlist_from_train_sample():
+    params = _params(index_type="ivf_flat", train_sample=100)
+    builder = FaissIndexBuilder(params)
+    builder.add(_vectors(1000), np.arange(1000))
+    assert builder.finish().ntotal == 1000
+    assert params["nlist"] == 100 // 39
@@ -0,0 +1,54 @@
+import numpy as np
+from app.utils.metadata_bitmaps import MetadataBitmapBuilder, MetadataBitmaps, matches_metadata
+
+ID_SPACE = 200
+
+def _selected(bitmap):
+    """位图中置位的向量ID"""
+    return set(np.flatnonzero(np.unpackbits(np.asarray(bitmap), bitorder="little")[:ID_SPACE]).tolist())
+
+def _build(tmp_path):
+    builder = MetadataBitmapBuilder()
+    for vector_id in range(ID_SPACE):
+        if vector_id % 10 == 9:
+            # 已删除的ID不登记
+            continue
+        builder.add(vector_id, {
+            "dynasty": "唐代" if vector_id < 150 else "宋代",
+            "author": "李白" if vector_id in (3, 77) else f"作者{vector_id}",
+            "emotions": "思乡,孤独" if vector_id % 50 == 0 else "",
+        })
+    builder.save(str(tmp_path), ID_SPACE)
+    return MetadataBitmaps.load(str(tmp_path))
+
+def test_frequent_values_are_dense_and_rare_values_sparse(tmp_path):
+    bitmaps = _build(tmp_path)
+    assert "bitmap" in bitmaps.fields["dynasty"]["唐代"]
+    assert "start" in bitmaps.fields["author"]["李白"]
+    assert "start" in bitmaps.fields["author"]["作者5"]
+
+def test_mask_single_value(tmp_path):
+    bitmaps = _build(tmp_path)
+    assert _selected(bitmaps.mask({"dynasty": ["宋代"]})) == {i for i in range(150, 200) if i % 10 != 9}
+    assert _selected(bitmaps.mask({"author": ["李白"]})) == {3, 77}
+    assert _selected(bitmaps.mask({"emotions": ["孤独"]})) == {0, 50, 100, 150}
+
+def test_mask_ors_values_and_ands_fields(tmp_path):
+    bitmaps = _build(tmp_path)
+    mask = bitmaps.mask({"author": ["李白", "作者160"], "dynasty": ["唐代"]})
+    assert _selected(mask) == {3, 77}
+    mask = bitmaps.mask({"emotions": ["思乡"], "dynasty": ["宋代", "唐代"]})
+    assert _selected(mask) == {0, 50, 100, 150}
+
+def test_mask_unknown_value_selects_nothing(tmp_path):
+    bitmaps = _build(tmp_path)
+    assert _selected(bitmaps.mask({"author": ["杜甫"]})) == set()
+    assert _selected(bitmaps.mask({})) == set(range(ID_SPACE))
+
+def test_load_without_bitmaps_returns_none(tmp_path):
+    assert MetadataBitmaps.load(str(tmp_path)) is None
+
+def test_matches_metadata_for_legacy_indexes():
+    metadata = {"dynasty": "唐代", "author": "李白", "emotions": "思乡,孤独"}
+    assert matches_metadata(metadata, {"emotions": ["孤独"], "dynasty": ["唐代", "宋代"]})
+    assert not matches_metadata(metadata, {"author": ["杜甫"]})
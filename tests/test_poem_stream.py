@@ -0,0 +1,32 @@
+import io
+import json
+import pytest
+from app.utils.poem_stream import iter_json_values, stream_poems
+
+def _poems(prefix, n):
+    return [{"id": f"{prefix}{i}", "title": "静夜思", "content": "床前明月光"} for i in range(n)]
+
+def test_iter_json_values_with_small_chunks():
+    poems = _poems("a", 20)
+    assert list(iter_json_values(io.StringIO(json.dumps(poems, ensure_ascii=False)), chunk_size=7)) == poems
+
+def test_stream_poems_keeps_file_order(tmp_path):
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps(_poems(name, 50), ensure_ascii=False), encoding="utf-8")
+        paths.append(str(path))
+    ids = [poem["id"] for poem in stream_poems(paths, workers=2, queue_size=4)]
+    assert ids == [poem["id"] for name in ("a", "b", "c") for poem in _poems(name, 50)]
+
+def test_stream_poems_raises_on_truncated_file(tmp_path):
+    good = tmp_path / "a.json"
+    good.write_text(json.dumps(_poems("a", 5)), encoding="utf-8")
+    bad = tmp_path / "b.json"
+    bad.write_text(json.dumps(_poems("b", 50))[:500], encoding="utf-8")
+    
+    seen = []
+    with pytest.raises(ValueError):
+        for poem in stream_poems([str(good), str(bad)]):
+            seen.append(poem["id"])
+    assert seen[:5] == [f"a{i}" for i in range(5)]
@@ -0,0 +1,32 @@
+from process_data import MANIFEST_VERSION, _make_manifest, diff_poems, poem_content_hash
+
+def _entry(poem_hash, ids):
+    return {"hash": poem_hash, "ids": ids}
+
+def test_diff_poems_classifies_added_changed_removed():
+    old_poems = {
+        "same": _entry("h1", [0]),
+        "edited": _entry("h2", [1, 2]),
+        "gone": _entry("h3", [3]),
+    }
+    hashes = {"same": "h1", "edited": "h2-new", "new": "h4"}
+    assert diff_poems(old_poems, hashes) == (["new"], ["edited"], ["gone"])
+
+def test_diff_poems_without_changes():
+    old_poems = {"a": _entry("h1", [0]), "b": _entry("h2", [1])}
+    assert diff_poems(old_poems, {"a": "h1", "b": "h2"}) == ([], [], [])
+
+def test_diff_poems_against_empty_manifest():
+    assert diff_poems({}, {"a": "h1"}) == (["a"], [], [])
+    assert diff_poems({"a": _entry("h1", [0])}, {}) == ([], [], ["a"])
+
+def test_poem_content_hash_tracks_every_field():
+    poem = {"id": "a", "title": "静夜思", "content": "床前明月光"}
+    assert poem_content_hash(poem) == poem_content_hash(dict(reversed(list(poem.items()))))
+    assert poem_content_hash(poem) != poem_content_hash(dict(poem, translation="译文"))
+
+def test_make_manifest_records_ids_per_poem():
+    manifest = _make_manifest({"chunk_size": 500}, {"a": "h1", "b": "h2"}, {"a": [4, 5]}, 6)
+    assert manifest["version"] == MANIFEST_VERSION
+    assert manifest["next_id"] == 6
+    assert manifest["poems"] == {"a": _entry("h1", [4, 5]), "b": _entry("h2", [])}
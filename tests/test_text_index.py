@@ -0,0 +1,51 @@
+import numpy as np
+from app.utils.text_index import CharNgramIndex, extract_ngrams
+
+def _poem(poem_id, title="", author="", content=""):
+    return {"id": poem_id, "title": title, "author": author, "content": content}
+
+def test_extract_ngrams_does_not_cross_punctuation():
+    assert extract_ngrams("明月，光") == ["明", "月", "明月", "光"]
+
+def test_title_hit_outranks_content_hit():
+    index = CharNgramIndex.build([
+        _poem("content", title="春晓", content="举头望明月"),
+        _poem("title", title="明月", content="春眠不觉晓"),
+    ])
+    hits = index.search("明月")
+    assert [index.doc_ids[row] for row, _ in hits] == ["title", "content"]
+
+def test_rare_term_outweighs_common_term():
+    poems = [_poem(str(i), content="明月照人") for i in range(10)]
+    poems.append(_poem("rare", content="江枫渔火"))
+    poems.append(_poem("common", content="明月高悬"))
+    index = CharNgramIndex.build(poems)
+    scores = {index.doc_ids[row]: score for row, score in index.search("江枫明月", top_k=20)}
+    assert scores["rare"] > scores["common"]
+
+def test_common_single_character_query_still_matches():
+    index = CharNgramIndex.build([_poem(str(i), content="床前明月光") for i in range(30)])
+    assert len(index.search("月", top_k=50)) == 30
+
+def test_search_limits_and_filters():
+    index = CharNgramIndex.build([_poem(str(i), content="明月" * (i + 1)) for i in range(5)])
+    assert index.search("明月", top_k=0) == []
+    assert index.search("清风") == []
+    assert len(index.search("明月", top_k=2)) == 2
+    
+    allowed = np.array([False, True, False, True, False])
+    rows = {row for row, _ in index.search("明月", top_k=5, allowed=allowed)}
+    assert rows == {1, 3}
+
+def test_save_and_load_round_trip(tmp_path):
+    index = CharNgramIndex.build([
+        _poem("a", title="静夜思", author="李白", content="床前明月光"),
+        _poem("b", title="春晓", author="孟浩然", content="春眠不觉晓"),
+    ])
+    index.save(str(tmp_path))
+    loaded = CharNgramIndex.load(str(tmp_path))
+    assert loaded.doc_ids == index.doc_ids
+    assert loaded.search("李白 明月") == index.search("李白 明月")
+
+def test_load_missing_index_returns_none(tmp_path):
+    assert CharNgramIndex.load(str(tmp_path)) is None